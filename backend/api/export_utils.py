@@ -0,0 +1,78 @@
+import csv
+import json
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+
+CHUNK_ROWS = 500
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: writerow возвращает готовую строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_txt(header, data):
+    yield 'Мой список покупок:\n\n'
+
+    for ingredient in data:
+        yield '□ {name} - {amount} {unit}\n'.format(
+            name=ingredient['ingredient__name'],
+            amount=ingredient['amount_total'],
+            unit=ingredient['ingredient__measurement_unit'])
+
+
+def iter_csv(header, data):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+
+    for ingredient in data:
+        yield writer.writerow((
+            ingredient['ingredient__name'], ingredient['amount_total'],
+            ingredient['ingredient__measurement_unit']))
+
+
+def iter_json(header, data):
+    separator = '['
+
+    for ingredient in data:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['amount_total'],
+        }, ensure_ascii=False)
+        separator = ',\n'
+
+    yield '[]' if separator == '[' else ']'
+
+
+EXPORT_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', iter_txt),
+    'csv': ('text/csv; charset=utf-8', iter_csv),
+    'json': ('application/json', iter_json),
+}
+
+
+def iter_chunks(lines):
+    lines = iter(lines)
+
+    while True:
+        chunk = ''.join(islice(lines, CHUNK_ROWS))
+        if not chunk:
+            return
+        yield chunk.encode()
+
+
+def make_export(export_format, header, data, filename, http_status):
+    """Отдает список покупок потоком, не собирая его целиком в памяти."""
+    content_type, iter_lines = EXPORT_FORMATS[export_format]
+
+    response = StreamingHttpResponse(
+        iter_chunks(iter_lines(header, data)),
+        content_type=content_type,
+        status=http_status)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    return response
@@ -1,19 +1,70 @@
 import base64
-import mimetypes
+import binascii
 
+from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
 from rest_framework import serializers
 
+from core.images import (
+    INVALID_IMAGE,
+    check_image_size,
+    get_rendition_names,
+    normalize_image,
+)
+
 
 class ImageBase64Field(serializers.ImageField):
+    """Принимает изображение в base64 или файлом и нормализует его."""
+
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            mime_data, image_string = data.split(';base64,')
-            image_data = base64.b64decode(image_string)
+        try:
+            if isinstance(data, str) and data.startswith('data:image'):
+                image_string = data.partition(';base64,')[2]
+                check_image_size(len(image_string) * 3 // 4)
+                image_data = base64.b64decode(image_string, validate=True)
+            elif hasattr(data, 'read'):
+                check_image_size(data.size)
+                image_data = data.read()
+            else:
+                raise ValidationError(INVALID_IMAGE)
+
+            image_data, extension = normalize_image(image_data)
+        except binascii.Error:
+            raise serializers.ValidationError(INVALID_IMAGE)
+        except ValidationError as error:
+            raise serializers.ValidationError(error.messages)
+
+        # Изображение уже декодировано и проверено Pillow, повторная
+        # проверка в ImageField не нужна.
+        return serializers.FileField.to_internal_value(
+            self, ContentFile(image_data, name=f'temp.{extension}'))
+
+
+def get_rendition_urls(image, request=None):
+    """Ссылки на уменьшенные копии изображения по названиям размеров.
+
+    Ссылки строятся по именам копий без обращения к хранилищу: копии
+    создаются при сохранении рецепта (см. core.images.make_renditions).
+    """
+    urls = {}
+
+    for rendition, name in get_rendition_names(image.name).items():
+        url = image.storage.url(name)
+        urls[rendition] = request.build_absolute_uri(url) if request else url
+
+    return urls
+
+
+class ImageRenditionsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения рецепта."""
 
-            mime_type = mime_data.removeprefix('data:')
-            extension = mimetypes.MimeTypes().guess_extension(mime_type)
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        kwargs.setdefault('source', 'image')
+        super().__init__(**kwargs)
 
-            data = ContentFile(image_data, name=f'temp.{extension}')
+    def to_representation(self, value):
+        if not value:
+            return None
 
-        return super().to_internal_value(data)
+        return get_rendition_urls(value, self.context.get('request'))
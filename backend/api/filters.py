@@ -1,8 +1,9 @@
-from django.db.models import Q
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as django_filters
-from rest_framework import filters
 
-from recipes.models import Recipe
+from recipes.catalog import get_tag_ids
+from recipes.fulltext import search_recipes
+from recipes.models import Favorite, Recipe, ShoppingCart
 
 
 class RecipeFilter(django_filters.FilterSet):
@@ -12,6 +13,7 @@ class RecipeFilter(django_filters.FilterSet):
         field_name='is_in_shopping_cart', method='filter_is_in_shopping_cart')
     is_favorited = django_filters.BooleanFilter(
         field_name='is_favorited', method='filter_is_favorited')
+    search = django_filters.CharFilter(method='filter_search')
 
     def filter_tags(self, queryset, name, value):
         values = self.request.GET.getlist(key='tags', default=[])
@@ -19,31 +21,36 @@ class RecipeFilter(django_filters.FilterSet):
         if not value:
             return queryset
 
-        queries = [Q(tags__slug=value) for value in values]
+        tag_ids = get_tag_ids(values)
+        if not tag_ids:
+            return queryset.none()
 
-        query = queries.pop()
-        for item in queries:
-            query |= item
+        return queryset.annotate(has_tags=Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag_id__in=tag_ids))
+        ).filter(has_tags=True)
 
-        return queryset.filter(query).distinct()
+    def __is_something(self, queryset, name, value, model):
+        user = self.request.user
 
-    def __is_something(self, queryset, name, value, related_field):
-        if self.request.user.is_anonymous:
-            return Recipe.objects.none() if value else queryset
+        if user.is_anonymous:
+            return queryset.none() if value else queryset
 
-        objects = getattr(self.request.user, related_field).all()
-        return queryset.filter(pk__in=[item.recipe.pk for item in objects])
+        if name not in queryset.query.annotations:
+            queryset = queryset.annotate(**{name: Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')))})
+
+        return queryset.filter(**{name: value})
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        return self.__is_something(queryset, name, value, 'shopping_cart')
+        return self.__is_something(queryset, name, value, ShoppingCart)
 
     def filter_is_favorited(self, queryset, name, value):
-        return self.__is_something(queryset, name, value, 'favorites')
+        return self.__is_something(queryset, name, value, Favorite)
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
 
     class Meta:
         model = Recipe
         fields = ('author',)
-
-
-class IngredientsSearchFilter(filters.SearchFilter):
-    search_param = 'name'
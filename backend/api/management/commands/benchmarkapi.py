@@ -0,0 +1,542 @@
+import base64
+import io
+import json
+import random
+import tempfile
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientRecipeRelation,
+    Recipe,
+    ShoppingCart,
+    Subscription,
+    Tag,
+)
+from recipes.toggles import add_members
+
+User = get_user_model()
+
+ANON = 'anon'
+AUTH = 'auth'
+
+PASSWORD = 'benchmark-password'
+BATCH_SIZE = 500
+# Сколько рецептов добавляется в избранное и список покупок одним пакетным
+# запросом.
+BATCH_TOGGLE_SIZE = 10
+# Сколько рецептов запрашивается одним запросом /api/recipes/batch/.
+RECIPES_BATCH_SIZE = 50
+
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+
+# Удаляемый в замерах рецепт и сколько пользователей держат его в
+# избранном и списке покупок: от их числа запросы зависеть не должны.
+DELETE_RECIPE_OFFSET = 10 ** 6
+DELETE_RECIPE_MEMBERS = 20
+
+Case = namedtuple(
+    'Case', ('name', 'method', 'url', 'callers', 'budget', 'data', 'before',
+             'after', 'scaling'),
+    defaults=(None, None, None, False))
+
+
+def percentile(samples, percent):
+    samples = sorted(samples)
+    index = round(percent / 100 * (len(samples) - 1))
+    return samples[index]
+
+
+def make_png(color='#4A61DD'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_image():
+    image = base64.b64encode(make_png()).decode()
+
+    return f'data:image/png;base64,{image}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет тестовую базу и замеряет число запросов к БД и время '
+        'ответа (p50/p95) для всех эндпоинтов API')
+    failure_message = 'Превышен бюджет запросов к БД: {}'
+    success_message = 'Все бюджеты соблюдены'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=2000,
+            help='Количество пользователей')
+        parser.add_argument(
+            '--recipes', type=int, default=5000,
+            help='Количество рецептов')
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Количество ингредиентов')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Количество повторов каждого запроса')
+        parser.add_argument(
+            '--only', type=str, default='',
+            help='Замерять только эндпоинты, в имени которых есть подстрока')
+        parser.add_argument(
+            '--output', type=str, default='',
+            help='Путь к .json файлу для сохранения результатов')
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Не удалять тестовую базу после замеров')
+
+    def handle(self, *args, **options):
+        if options['recipes'] <= BATCH_TOGGLE_SIZE:
+            raise CommandError(
+                f'Рецептов должно быть больше {BATCH_TOGGLE_SIZE}')
+
+        self.options = options
+        self.random = random.Random(42)
+
+        setup_test_environment()
+        old_config = setup_databases(
+            verbosity=0, interactive=False, keepdb=options['keepdb'])
+
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(
+                        CACHES=BENCHMARK_CACHES, MEDIA_ROOT=media_root):
+                    started = time.perf_counter()
+                    self.seed()
+                    self.stdout.write(
+                        'База заполнена за {:.1f} с ({})'.format(
+                            time.perf_counter() - started, connection.vendor))
+
+                    results, failures = self.run_cases()
+        finally:
+            teardown_databases(
+                old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as fp:
+                json.dump(results, fp, ensure_ascii=False, indent=2)
+
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(self.failure_message.format(len(failures)))
+
+        self.stdout.write(self.style.SUCCESS(self.success_message))
+
+    def sample(self, population, count):
+        """Случайная выборка не больше count элементов."""
+        return self.random.sample(population, min(count, len(population)))
+
+    def seed(self):
+        password = make_password(PASSWORD)
+        users_count = max(self.options['users'], 10)
+
+        User.objects.bulk_create((
+            User(
+                username=f'user{i}', email=f'user{i}@foodgram.ru',
+                first_name=f'Имя{i}', last_name=f'Фамилия{i}',
+                password=password)
+            for i in range(users_count)), batch_size=BATCH_SIZE)
+        user_ids = list(User.objects.values_list('id', flat=True))
+
+        Tag.objects.bulk_create(
+            Tag(name=name, color=color, slug=slug) for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+                ('Ужин', '#8775D2', 'dinner'),
+            ))
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+
+        Ingredient.objects.bulk_create((
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(self.options['ingredients'])),
+            batch_size=BATCH_SIZE)
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+
+        # У каждого рецепта свое изображение, как в реальной базе: так
+        # замеры учитывают работу с копиями каждого изображения.
+        Recipe.objects.bulk_create((
+            Recipe(
+                author_id=self.random.choice(user_ids), name=f'Рецепт {i}',
+                text=f'Описание рецепта {i}. ' * 10,
+                cooking_time=self.random.randint(1, 120),
+                image=default_storage.save(
+                    f'recipe/benchmark{i}.png',
+                    ContentFile(make_png(f'#{i % 0x1000000:06X}'))))
+            for i in range(self.options['recipes'])), batch_size=BATCH_SIZE)
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+
+        Recipe.tags.through.objects.bulk_create((
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.random.sample(tag_ids, 2)),
+            batch_size=BATCH_SIZE)
+        IngredientRecipeRelation.objects.bulk_create((
+            IngredientRecipeRelation(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=self.random.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in self.sample(
+                ingredient_ids, self.random.randint(3, 12))),
+            batch_size=BATCH_SIZE)
+
+        self.user, self.other = User.objects.order_by('id')[:2]
+        self.user_ids = user_ids
+        self.recipe_ids = recipe_ids
+        self.ingredient_ids = ingredient_ids
+        self.tag_ids = tag_ids
+
+        # Первые BATCH_TOGGLE_SIZE рецептов и последний пользователь не
+        # попадают в наборы пользователя, от имени которого идут замеры:
+        # их он добавляет в кейсах добавления.
+        for model, per_user, power_user in (
+                (Favorite, 20, 500), (ShoppingCart, 3, 30)):
+            model.objects.bulk_create((
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in (
+                    self.sample(recipe_ids[BATCH_TOGGLE_SIZE:], power_user)
+                    if user_id == self.user.id
+                    else self.sample(recipe_ids, per_user))),
+                batch_size=BATCH_SIZE)
+
+        Subscription.objects.bulk_create((
+            Subscription(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in (
+                self.sample(user_ids[:-1], 50) if user_id == self.user.id
+                else self.sample(user_ids, 5))
+            if author_id != user_id), batch_size=BATCH_SIZE)
+
+        # bulk_create не отправляет сигналы, поэтому счетчики, поисковый
+        # индекс, ленты, итоги списков покупок и копии изображений
+        # пересчитываются и создаются отдельно.
+        call_command('recountcounters', stdout=io.StringIO())
+        call_command('rebuildsearchindex', stdout=io.StringIO())
+        call_command('rebuildtimelines', stdout=io.StringIO())
+        call_command('rebuildshoppingcarttotals', stdout=io.StringIO())
+        call_command('makerenditions', stdout=io.StringIO())
+
+        self.free_recipe_ids = list(Recipe.objects.exclude(
+            favorites__user=self.user).exclude(
+            shopping_cart__user=self.user).values_list('id', flat=True)[
+            :BATCH_TOGGLE_SIZE])
+        self.free_recipe_id = self.free_recipe_ids[0]
+        self.free_author_id = User.objects.exclude(
+            subscripters__user=self.user).exclude(
+            pk=self.user.pk).values_list('id', flat=True)[0]
+        self.token = Token.objects.create(user=self.user)
+
+    def get_clients(self):
+        auth = APIClient()
+        auth.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+        return {ANON: APIClient(), AUTH: auth}
+
+    def restore_token(self):
+        Token.objects.get_or_create(user=self.user, key=self.token.key)
+
+    def get_cases(self):
+        recipe = self.free_recipe_id
+        batch = self.free_recipe_ids
+        author = self.free_author_id
+        image = make_image()
+        recipe_data = {
+            'name': 'Рецепт для замеров', 'text': 'Описание',
+            'cooking_time': 10, 'image': image, 'tags': self.tag_ids[:2],
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 10}
+                for ingredient_id in self.ingredient_ids[:10]]
+        }
+        own_recipe = Recipe.objects.filter(author=self.user).first()
+        deleted_recipe = max(self.recipe_ids) + DELETE_RECIPE_OFFSET
+
+        def add_to(model, **kwargs):
+            return lambda: model.objects.get_or_create(
+                user=self.user, **kwargs)
+
+        def remove_from(model, **kwargs):
+            return lambda *args: model.objects.filter(
+                user=self.user, **kwargs).delete()
+
+        def create_recipe_to_delete(members):
+            def create():
+                recipe = Recipe.objects.create(
+                    pk=deleted_recipe, author=self.user,
+                    name='Рецепт для удаления', text='Описание',
+                    cooking_time=10, image=default_storage.save(
+                        'recipe/benchmark-delete.png',
+                        ContentFile(make_png())))
+                recipe.tags.set(self.tag_ids[:2])
+                IngredientRecipeRelation.objects.bulk_create(
+                    IngredientRecipeRelation(
+                        recipe=recipe, ingredient_id=ingredient_id,
+                        amount=10)
+                    for ingredient_id in self.ingredient_ids[:10])
+                for user_id in self.user_ids[:members]:
+                    add_members(Favorite, user_id, (recipe.pk,))
+                    add_members(ShoppingCart, user_id, (recipe.pk,))
+            return create
+
+        def delete_created_recipe(response):
+            Recipe.objects.filter(pk=response.data['id']).delete()
+
+        def delete_created_user(response):
+            User.objects.filter(pk=response.data['id']).delete()
+
+        def reset_password(response):
+            self.user.set_password(PASSWORD)
+            self.user.save(update_fields=('password',))
+
+        return (
+            Case('tags-list', 'get', reverse('api:tags-list'),
+                 (ANON, AUTH), 2),
+            Case('tags-detail', 'get',
+                 reverse('api:tags-detail', args=(self.tag_ids[0],)),
+                 (ANON, AUTH), 2),
+            Case('ingredients-list', 'get',
+                 reverse('api:ingredients-list') + '?name=ингредиент 1',
+                 (ANON, AUTH), 2),
+            Case('ingredients-detail', 'get',
+                 reverse('api:ingredients-detail',
+                         args=(self.ingredient_ids[0],)),
+                 (ANON, AUTH), 2),
+            Case('recipes-list', 'get', reverse('api:recipes-list'),
+                 (ANON, AUTH), 5, scaling=True),
+            Case('recipes-list-cursor', 'get',
+                 reverse('api:recipes-list') + '?pagination=cursor',
+                 (ANON, AUTH), 4, scaling=True),
+            Case('recipes-list-tags', 'get',
+                 reverse('api:recipes-list') + '?tags=breakfast&tags=dinner',
+                 (ANON, AUTH), 5, scaling=True),
+            Case('recipes-list-search', 'get',
+                 reverse('api:recipes-list') + '?search=рецепт ингредиент',
+                 (ANON, AUTH), 5, scaling=True),
+            Case('recipes-list-cards', 'get',
+                 reverse('api:recipes-list')
+                 + '?fields=id,name,image,cooking_time,author',
+                 (ANON, AUTH), 3, scaling=True),
+            Case('recipes-list-favorited', 'get',
+                 reverse('api:recipes-list') + '?is_favorited=1',
+                 (AUTH,), 5, scaling=True),
+            Case('recipes-list-shopping-cart', 'get',
+                 reverse('api:recipes-list') + '?is_in_shopping_cart=1',
+                 (AUTH,), 5, scaling=True),
+            Case('recipes-feed', 'get', reverse('api:recipes-feed'),
+                 (AUTH,), 4, scaling=True),
+            # Поиск в ленте только отбирает рецепты: страница и курсор
+            # строятся по порядку ленты.
+            Case('recipes-feed-search', 'get',
+                 reverse('api:recipes-feed') + '?search=рецепт',
+                 (AUTH,), 4, scaling=True),
+            Case('recipes-batch', 'get',
+                 reverse('api:recipes-batch') + '?ids=' + ','.join(
+                     map(str, self.recipe_ids[:RECIPES_BATCH_SIZE])),
+                 (ANON, AUTH), 4),
+            Case('recipes-detail', 'get',
+                 reverse('api:recipes-detail', args=(recipe,)),
+                 (ANON, AUTH), 4),
+            Case('recipes-create', 'post', reverse('api:recipes-list'),
+                 (AUTH,), 26, data=recipe_data,
+                 after=delete_created_recipe),
+            Case('recipes-update', 'patch',
+                 reverse('api:recipes-detail', args=(own_recipe.pk,)),
+                 (AUTH,), 25, data=recipe_data),
+            # Рецепт в избранном и списке покупок DELETE_RECIPE_MEMBERS
+            # пользователей; проверка масштабирования — с одним.
+            Case('recipes-delete', 'delete',
+                 reverse('api:recipes-detail', args=(deleted_recipe,)),
+                 (AUTH,), 20,
+                 before=create_recipe_to_delete(DELETE_RECIPE_MEMBERS),
+                 scaling=create_recipe_to_delete(1)),
+            Case('download-shopping-cart', 'get',
+                 reverse('api:download_shopping_cart'), (AUTH,), 3),
+            Case('download-shopping-cart-csv', 'get',
+                 reverse('api:download_shopping_cart') + '?format=csv',
+                 (AUTH,), 3),
+            Case('shopping-cart-totals', 'get',
+                 reverse('api:shopping_cart_totals'), (AUTH,), 2),
+            Case('shopping-cart-add', 'post',
+                 reverse('api:shopping_cart', args=(recipe,)), (AUTH,), 6,
+                 after=remove_from(ShoppingCart, recipe_id=recipe)),
+            Case('shopping-cart-remove', 'delete',
+                 reverse('api:shopping_cart', args=(recipe,)), (AUTH,), 6,
+                 before=add_to(ShoppingCart, recipe_id=recipe)),
+            Case('favorite-add', 'post',
+                 reverse('api:favorites', args=(recipe,)), (AUTH,), 5,
+                 after=remove_from(Favorite, recipe_id=recipe)),
+            Case('favorite-remove', 'delete',
+                 reverse('api:favorites', args=(recipe,)), (AUTH,), 4,
+                 before=add_to(Favorite, recipe_id=recipe)),
+            # Рецепты добавляются одним INSERT, счетчики избранного всех
+            # рецептов обновляются одним UPDATE.
+            Case('favorites-batch', 'post', reverse('api:favorites_batch'),
+                 (AUTH,), 4, data={'add': batch},
+                 after=remove_from(Favorite, recipe_id__in=batch)),
+            Case('shopping-cart-batch', 'post',
+                 reverse('api:shopping_cart_batch'), (AUTH,), 5,
+                 data={'add': batch},
+                 after=remove_from(ShoppingCart, recipe_id__in=batch)),
+            Case('subscriptions', 'get', reverse('api:subscriptions'),
+                 (AUTH,), 4, scaling=True),
+            Case('subscriptions-cursor', 'get',
+                 reverse('api:subscriptions') + '?pagination=cursor',
+                 (AUTH,), 3, scaling=True),
+            Case('subscribe', 'post',
+                 reverse('api:subscribe', args=(author,)), (AUTH,), 9,
+                 after=remove_from(Subscription, author_id=author)),
+            Case('unsubscribe', 'delete',
+                 reverse('api:subscribe', args=(author,)), (AUTH,), 7,
+                 before=add_to(Subscription, author_id=author)),
+            Case('users-list', 'get', reverse('api:customuser-list'),
+                 (ANON, AUTH), 3),
+            Case('users-detail', 'get',
+                 reverse('api:customuser-detail', args=(self.other.pk,)),
+                 (AUTH,), 2),
+            Case('users-me', 'get', reverse('api:customuser-me'),
+                 (AUTH,), 1),
+            Case('users-create', 'post', reverse('api:customuser-list'),
+                 (ANON,), 4, data={
+                     'email': 'new@foodgram.ru', 'username': 'new',
+                     'first_name': 'Имя', 'last_name': 'Фамилия',
+                     'password': PASSWORD},
+                 after=delete_created_user),
+            Case('users-set-password', 'post',
+                 reverse('api:customuser-set-password'), (AUTH,), 2,
+                 data={'current_password': PASSWORD,
+                       'new_password': PASSWORD[::-1]},
+                 after=reset_password),
+            Case('token-login', 'post', reverse('api:login'), (ANON,), 6,
+                 data={'email': self.other.email, 'password': PASSWORD},
+                 after=lambda response: Token.objects.filter(
+                     user=self.other).delete()),
+            Case('token-logout', 'post', reverse('api:logout'), (AUTH,), 3,
+                 after=lambda response: self.restore_token()),
+        )
+
+    def request(self, client, case, url, capture=False):
+        if case.before:
+            case.before()
+
+        context = CaptureQueriesContext(connection)
+        with context if capture else nullcontext():
+            started = time.perf_counter()
+            response = getattr(client, case.method)(
+                url, case.data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+
+        if response.status_code >= 400:
+            raise CommandError('{} {} вернул {}: {}'.format(
+                case.method.upper(), url, response.status_code,
+                response.content[:300]))
+
+        if case.after:
+            case.after(response)
+
+        return elapsed, len(context) if capture else None
+
+    def count_queries(self, client, case, url):
+        return self.request(client, case, url, capture=True)[1]
+
+    def run_cases(self):
+        clients = self.get_clients()
+        results = []
+        failures = []
+
+        header = '{:<28} {:<5} {:>7} {:>7} {:>9} {:>9}'.format(
+            'endpoint', 'user', 'queries', 'budget', 'p50, ms', 'p95, ms')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        for case in self.get_cases():
+            if self.options['only'] not in case.name:
+                continue
+
+            for caller in case.callers:
+                client = clients[caller]
+                # Прогрев: запросы, которые выполняются один раз до
+                # заполнения кэшей, в бюджет не входят.
+                self.request(client, case, case.url)
+                queries = self.count_queries(client, case, case.url)
+
+                if queries > case.budget:
+                    failures.append(
+                        f'{case.name} ({caller}): {queries} запросов к БД '
+                        f'при бюджете {case.budget}')
+
+                if callable(case.scaling):
+                    # scaling — подготовка того же запроса с одним
+                    # связанным объектом вместо многих.
+                    single = self.count_queries(
+                        client, case._replace(before=case.scaling),
+                        case.url)
+                    if single != queries:
+                        failures.append(
+                            f'{case.name} ({caller}): число запросов '
+                            f'растет с числом связанных объектов ({single} '
+                            f'для одного, {queries} для многих)')
+                elif case.scaling:
+                    separator = '&' if '?' in case.url else '?'
+                    single = self.count_queries(
+                        client, case, f'{case.url}{separator}limit=1')
+                    if single != queries:
+                        failures.append(
+                            f'{case.name} ({caller}): число запросов '
+                            f'растет с размером страницы ({single} для '
+                            f'одного объекта, {queries} для страницы)')
+
+                timings = [
+                    self.request(client, case, case.url)[0] * 1000
+                    for _ in range(self.options['repeat'])]
+                p50 = percentile(timings, 50)
+                p95 = percentile(timings, 95)
+
+                results.append({
+                    'endpoint': case.name, 'caller': caller,
+                    'method': case.method.upper(), 'url': case.url,
+                    'queries': queries, 'budget': case.budget,
+                    'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2),
+                })
+
+                line = '{:<28} {:<5} {:>7} {:>7} {:>9.1f} {:>9.1f}'.format(
+                    case.name, caller, queries, case.budget, p50, p95)
+                if queries > case.budget:
+                    line = self.style.ERROR(line)
+                self.stdout.write(line)
+
+        return results, failures
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.management.commands.benchmarkapi import percentile
+from api.pdf_utils import render_pdf
+from core.pdf import load_fonts
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время генерации PDF со списком покупок: холодный старт '
+        '(с разбором шрифтов) и повторные генерации в том же процессе')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=50,
+            help='Количество строк в списке покупок')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Количество повторных генераций')
+
+    @staticmethod
+    def measure(data):
+        started = time.perf_counter()
+        render_pdf(data)
+        return (time.perf_counter() - started) * 1000
+
+    def handle(self, *args, **options):
+        data = [
+            {
+                'ingredient__name': f'Ингредиент №{i}',
+                'ingredient__measurement_unit': 'г',
+                'amount_total': i * 10,
+            }
+            for i in range(options['rows'])
+        ]
+
+        load_fonts.cache_clear()
+        cold = self.measure(data)
+        warm = [self.measure(data) for _ in range(options['repeat'])]
+
+        self.stdout.write(f'Строк в списке: {options["rows"]}')
+        self.stdout.write(f'Холодный старт: {cold:.1f} мс')
+        self.stdout.write('Повторно: p50 {:.1f} мс, p95 {:.1f} мс'.format(
+            percentile(warm, 50), percentile(warm, 95)))
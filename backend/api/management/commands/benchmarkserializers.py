@@ -0,0 +1,108 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.urls import reverse
+from rest_framework.settings import api_settings
+
+from api.management.commands import benchmarkapi
+from api.management.commands.benchmarkapi import percentile
+from api.views import IngredientViewSet, RecipeViewSet
+
+SERIALIZER = 'serializer'
+FAST = 'fast'
+
+
+@contextmanager
+def serializer_path(viewset):
+    """Временно переключает вьюсет на сериализатор и JSONRenderer."""
+    reader, renderers = viewset.list_reader_class, viewset.renderer_classes
+    viewset.list_reader_class = None
+    viewset.renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+
+    try:
+        yield
+    finally:
+        viewset.list_reader_class = reader
+        viewset.renderer_classes = renderers
+
+
+class Command(benchmarkapi.Command):
+    help = (
+        'Сравнивает время ответа списка рецептов и справочника ингредиентов '
+        'при сериализации через DRF и через быстрый путь (values() и '
+        'orjson) и проверяет, что ответы совпадают побайтно')
+    failure_message = 'Ответы быстрого пути отличаются от сериализатора: {}'
+    success_message = 'Ответы совпадают'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--page-size', type=int, default=100,
+            help='Количество рецептов на странице')
+
+    def get_cases(self):
+        return (
+            ('recipes-page', reverse('api:recipes-list')
+             + f'?limit={self.options["page_size"]}', RecipeViewSet),
+            ('ingredients-catalog', reverse('api:ingredients-list'),
+             IngredientViewSet),
+        )
+
+    def measure(self, client, url):
+        # Первый ответ прогревает кэши и служит образцом для сравнения.
+        content = client.get(url).content
+        timings = []
+
+        for _ in range(self.options['repeat']):
+            started = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        return content, timings
+
+    def run_cases(self):
+        clients = self.get_clients()
+        results = []
+        failures = []
+
+        header = '{:<20} {:<5} {:<10} {:>9} {:>9} {:>8}'.format(
+            'endpoint', 'user', 'path', 'p50, ms', 'p95, ms', 'speedup')
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        for name, url, viewset in self.get_cases():
+            if self.options['only'] not in name:
+                continue
+
+            for caller, client in clients.items():
+                content = {}
+                p50 = {}
+
+                for path in (SERIALIZER, FAST):
+                    context = (
+                        serializer_path(viewset) if path == SERIALIZER
+                        else nullcontext())
+                    with context:
+                        content[path], timings = self.measure(client, url)
+
+                    p50[path] = percentile(timings, 50)
+                    p95 = percentile(timings, 95)
+                    results.append({
+                        'endpoint': name, 'caller': caller, 'path': path,
+                        'url': url, 'bytes': len(content[path]),
+                        'p50_ms': round(p50[path], 2),
+                        'p95_ms': round(p95, 2),
+                    })
+                    self.stdout.write(
+                        '{:<20} {:<5} {:<10} {:>9.1f} {:>9.1f} {:>8}'.format(
+                            name, caller, path, p50[path], p95,
+                            '{:.1f}x'.format(p50[SERIALIZER] / p50[path])
+                            if path == FAST else ''))
+
+                if content[SERIALIZER] != content[FAST]:
+                    failures.append(
+                        f'{name} ({caller}): ответы отличаются '
+                        f'({len(content[SERIALIZER])} и '
+                        f'{len(content[FAST])} байт)')
+
+        return results, failures
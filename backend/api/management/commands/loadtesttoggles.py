@@ -0,0 +1,185 @@
+import http.client
+import io
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from api.management.commands.benchmarkapi import percentile
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscription
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'loadtest'
+TARGETS_COUNT = 50
+
+# Переключатель -> (модель, имя URL, модель объекта).
+TOGGLES = {
+    'favorite': (Favorite, 'api:favorites', Recipe),
+    'shopping_cart': (ShoppingCart, 'api:shopping_cart', Recipe),
+    'subscribe': (Subscription, 'api:subscribe', User),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест переключателей избранного, списка покупок и '
+        'подписок на запущенном сервере: каждый клиент в цикле добавляет '
+        'и удаляет объект, команда выводит пропускную способность и время '
+        'ответа. Сервер должен работать с той же БД, что и команда')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', type=str, default='http://127.0.0.1:8000',
+            help='Адрес сервера')
+        parser.add_argument(
+            '--clients', type=int, default=100,
+            help='Количество одновременных клиентов')
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность теста в секундах')
+        parser.add_argument(
+            '--toggle', choices=TOGGLES, action='append',
+            help='Проверяемые переключатели (по умолчанию все)')
+        parser.add_argument(
+            '--double-tap', action='store_true',
+            help='Каждый клиент шлет каждый запрос дважды одновременно '
+                 '(ответ 400 на повтор не считается ошибкой)')
+        parser.add_argument(
+            '--output', type=str, default='',
+            help='Путь к .json файлу для сохранения результатов')
+
+    @staticmethod
+    def prepare_clients(count):
+        """Создает пользователей нагрузочного теста и их токены."""
+        usernames = [f'{USERNAME_PREFIX}{i}' for i in range(count)]
+        existing = set(User.objects.filter(
+            username__in=usernames).values_list('username', flat=True))
+        password = make_password(None)
+
+        User.objects.bulk_create(
+            User(username=username, email=f'{username}@foodgram.ru',
+                 first_name=username, last_name=username, password=password)
+            for username in usernames if username not in existing)
+
+        users = list(User.objects.filter(username__in=usernames))
+        for model, _, _ in TOGGLES.values():
+            model.objects.filter(user__in=users).delete()
+
+        return [
+            Token.objects.get_or_create(user=user)[0].key for user in users]
+
+    @staticmethod
+    def get_targets(toggle, count):
+        """id рецептов или авторов, с которыми работает переключатель."""
+        model = TOGGLES[toggle][2]
+        queryset = model.objects.all()
+
+        if model is User:
+            queryset = queryset.exclude(username__startswith=USERNAME_PREFIX)
+
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[
+            :count])
+        if not ids:
+            raise CommandError(f'Нет объектов для переключателя {toggle}')
+
+        return ids
+
+    def run_client(self, index, token, step, paths, deadline, results):
+        url = urlsplit(self.options['url'])
+        connection = http.client.HTTPConnection(url.hostname, url.port)
+        headers = {'Authorization': f'Token {token}'}
+        timings = []
+        errors = 0
+
+        while time.monotonic() < deadline:
+            path = paths[step % len(paths)]
+            step += 1
+
+            for method, expected in (('POST', 201), ('DELETE', 204)):
+                started = time.perf_counter()
+                try:
+                    connection.request(method, path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException):
+                    # Следующий запрос откроет новое соединение.
+                    connection.close()
+                    errors += 1
+                    continue
+
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status != expected and not (
+                        self.options['double_tap']
+                        and response.status == 400):
+                    errors += 1
+
+        connection.close()
+        results[index] = (timings, errors)
+
+    def handle(self, *args, **options):
+        self.options = options
+        toggles = options['toggle'] or list(TOGGLES)
+        tokens = self.prepare_clients(options['clients'])
+        paths = [
+            reverse(TOGGLES[toggle][1], args=(pk,))
+            for toggle in toggles
+            for pk in self.get_targets(toggle, TARGETS_COUNT)]
+
+        # При --double-tap у каждого токена два потока с одинаковой
+        # последовательностью запросов: они гонятся за одними и теми же
+        # строками, как двойное нажатие на кнопку.
+        clients = list(enumerate(tokens))
+        if options['double_tap']:
+            clients = [client for client in clients for _ in range(2)]
+        results = [None] * len(clients)
+        deadline = time.monotonic() + options['duration']
+        threads = [
+            threading.Thread(
+                target=self.run_client,
+                args=(index, token, step, paths, deadline, results))
+            for index, (step, token) in enumerate(clients)]
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings = [
+            timing for client_timings, _ in results
+            for timing in client_timings]
+        errors = sum(client_errors for _, client_errors in results)
+        if not timings:
+            raise CommandError(f'Сервер {options["url"]} не ответил')
+
+        summary = {
+            'url': options['url'], 'clients': options['clients'],
+            'toggles': toggles, 'requests': len(timings), 'errors': errors,
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+        }
+
+        self.stdout.write(
+            'Запросов: {requests}, ошибок: {errors}, {rps} запросов/с; '
+            'время ответа p50 {p50_ms} мс, p95 {p95_ms} мс, '
+            'p99 {p99_ms} мс'.format(**summary))
+
+        # Гонки не должны приводить к расхождению счетчиков с данными.
+        counters = io.StringIO()
+        call_command('recountcounters', dry_run=True, stdout=counters)
+        self.stdout.write(counters.getvalue().rstrip())
+
+        if options['output']:
+            with open(options['output'], 'w') as fp:
+                json.dump(summary, fp, ensure_ascii=False, indent=2)
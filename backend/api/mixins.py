@@ -1,6 +1,87 @@
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
 from rest_framework import mixins, permissions, viewsets
+from rest_framework.response import Response
+
+from recipes.catalog import get_catalog_version
 
 
 class ListRetrieveViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
                           mixins.RetrieveModelMixin):
     permission_classes = (permissions.AllowAny,)
+
+
+class FastListMixin:
+    """Список через быстрый путь чтения (см. api.readers).
+
+    Если у вьюсета задан list_reader_class, список строится из словарей
+    .values() без сериализатора; иначе работает обычный list.
+    """
+    list_reader_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.list_reader_class is None:
+            return super().list(request, *args, **kwargs)
+
+        reader = self.list_reader_class(request)
+        rows = reader.get_rows(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(reader.serialize(page))
+
+        return Response(reader.serialize(rows))
+
+
+class CatalogViewSet(FastListMixin, ListRetrieveViewSet):
+    """Справочник с поддержкой условных GET-запросов.
+
+    ETag и Last-Modified вычисляются по версии справочника, поэтому на
+    запрос с актуальным If-None-Match отдается 304 без обращения к БД и
+    сериализации. Ответы на запросы с параметрами из unversioned_params
+    зависят не только от версии (например, ранжирование по популярности),
+    поэтому для них условный GET не выполняется.
+    """
+    catalog = None
+    unversioned_params = ()
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if any(param in request.query_params
+               for param in self.unversioned_params):
+            return handler(request, *args, **kwargs)
+
+        version = get_catalog_version(self.catalog)
+        etag = quote_etag('{}-{}-{}'.format(
+            self.catalog, version, request.accepted_renderer.format))
+        last_modified = version // 10 ** 9
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(
+                response, public=True,
+                max_age=settings.CATALOG_CACHE_MAX_AGE)
+            patch_vary_headers(response, ('Accept',))
+
+        return response
+
+    def get_list_response(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_list_response, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,11 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.settings import APISettings
+
+
+class IgnoreFormatContentNegotiation(DefaultContentNegotiation):
+    """Не выбирает рендерер по параметру ?format=.
+
+    На эндпоинтах выгрузки этот параметр задает формат файла, а ответы
+    с ошибками по-прежнему отдаются в JSON.
+    """
+    settings = APISettings(user_settings={'URL_FORMAT_OVERRIDE': None})
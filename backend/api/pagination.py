@@ -1,5 +1,73 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class CustomCursorPagination(CursorPagination):
+    page_size_query_param = 'limit'
+    ordering = ('-created', '-id')
+
+
+class SubscriptionCursorPagination(CustomCursorPagination):
+    ordering = ('id',)
+
+
+class FeedPagination(CustomCursorPagination):
+    ordering = ('-feed_created', '-feed_id')
+
+
+class OptionalCursorPaginationMixin:
+    """Переключает пагинацию на курсорную по параметру ?pagination=cursor.
+
+    Курсорная пагинация не считает COUNT(*) и не использует OFFSET, поэтому
+    стоимость страницы не зависит от ее номера. Параметр сохраняется в
+    ссылках next/previous. Параметры из cursor_incompatible_params задают
+    свой порядок, который курсор бы молча заменил, поэтому с курсорной
+    пагинацией они отклоняются.
+    """
+    cursor_pagination_class = CustomCursorPagination
+    pagination_query_param = 'pagination'
+    cursor_incompatible_params = ()
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+
+        if request.query_params.get(self.pagination_query_param) == 'cursor':
+            for param in self.cursor_incompatible_params:
+                if request.query_params.get(param):
+                    raise ValidationError({param: (
+                        'Не поддерживается с курсорной пагинацией '
+                        '(pagination=cursor).')})
+
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator:
+            return self.cursor_paginator.to_html()
+
+        return super().to_html()
+
+
+class RecipePagination(OptionalCursorPaginationMixin,
+                       CustomPageNumberPagination):
+    # Результаты поиска сортируются по релевантности, а курсор — по дате.
+    cursor_incompatible_params = ('search',)
+
+
+class SubscriptionPagination(OptionalCursorPaginationMixin,
+                             CustomPageNumberPagination):
+    cursor_pagination_class = SubscriptionCursorPagination
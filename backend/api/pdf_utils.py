@@ -1,10 +1,82 @@
+import hashlib
+import json
+import threading
+from collections import Counter
+
 from django.conf import settings
 from django.http import HttpResponse
 
 from core import pdf
+from core.cache import LRUCache
+
+# Меняется при любом изменении оформления PDF, чтобы не отдавать из кэша
+# файлы, сгенерированные по старому шаблону.
+PDF_TEMPLATE_VERSION = 1
+
+# Кэш — в памяти процесса. Ключи PDF — хэш содержимого, поэтому
+# устаревший PDF не отдается ни одним процессом; invalidate_pdf только
+# освобождает память в процессе, обработавшем изменение, а в остальных
+# неиспользуемые PDF вытесняются по LRU. Одинаковые списки покупок разных
+# пользователей делят один PDF: он удаляется, когда на него не ссылается
+# ни один владелец.
+pdf_cache = LRUCache(max_size=settings.PDF_CACHE_MAX_SIZE)
+pdf_references = Counter()
+pdf_owners_lock = threading.RLock()
+
+
+def release_pdf(owner, key):
+    """Снимает ссылку owner на PDF key и удаляет PDF без ссылок."""
+    with pdf_owners_lock:
+        pdf_references[key] -= 1
+        if pdf_references[key] > 0:
+            return
+
+        del pdf_references[key]
+        pdf_cache.delete(key)
+
+
+pdf_owners = LRUCache(
+    max_size=settings.PDF_CACHE_MAX_OWNERS, sizeof=lambda value: 1,
+    on_evict=release_pdf)
+
+
+def set_pdf_owner(owner, key):
+    """Запоминает key как последний PDF, сгенерированный для owner."""
+    with pdf_owners_lock:
+        previous = pdf_owners.get(owner)
+        if previous == key:
+            return
+
+        pdf_references[key] += 1
+        pdf_owners.set(owner, key)
 
+        if previous is not None:
+            release_pdf(owner, previous)
 
-def make_pdf(header, data, filename, http_status):
+
+def get_pdf_key(data):
+    """Ключ кэша — хэш содержимого списка покупок и версии шаблона."""
+    content = json.dumps(
+        [PDF_TEMPLATE_VERSION, settings.SITE_NAME, [
+            (item['ingredient__name'], item['ingredient__measurement_unit'],
+             item['amount_total'])
+            for item in data]],
+        ensure_ascii=False)
+
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def invalidate_pdf(owner):
+    """Забывает последний PDF owner; PDF удаляется, если он ничей больше."""
+    with pdf_owners_lock:
+        key = pdf_owners.get(owner)
+
+        if key is not None:
+            pdf_owners.delete(owner)
+            release_pdf(owner, key)
+
+
+def render_pdf(data):
     site_name = settings.SITE_NAME
 
     pdf_data = [
@@ -25,7 +97,20 @@ def make_pdf(header, data, filename, http_status):
     pdf_obj.data = pdf_data
     pdf_obj.footer_text = f'Список покупок сгенерирован на сайте {site_name}'
 
-    content = pdf_obj.pdf_render()
+    return pdf_obj.pdf_render()
+
+
+def make_pdf(header, data, filename, http_status, owner=None):
+    data = list(data)
+    key = get_pdf_key(data)
+
+    content = pdf_cache.get(key)
+    if content is None:
+        content = render_pdf(data)
+        pdf_cache.set(key, content)
+
+    if owner is not None:
+        set_pdf_owner(owner, key)
 
     response = HttpResponse(
         content=content,
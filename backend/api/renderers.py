@@ -0,0 +1,46 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+# JSONRenderer экранирует разделители строк и абзацев, чтобы ответ можно
+# было встроить в JavaScript; orjson этого не делает.
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с тем же компактным выводом.
+
+    Даты и подклассы встроенных типов передаются кодировщику DRF, поэтому
+    ответ совпадает с JSONRenderer побайтно. Отличается только запись
+    чисел с плавающей точкой в экспоненциальной форме (1e-6 вместо 1e-06),
+    таких чисел в ответах API нет. Если клиент запросил отступы или данные
+    не поддерживаются orjson (например, нестроковые ключи), ответ
+    формирует обычный JSONRenderer.
+    """
+    options = (
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_SUBCLASS
+        | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        if self.get_indent(
+                accepted_media_type, renderer_context or {}) is not None:
+            return super().render(
+                data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=self.options)
+        except TypeError:
+            return super().render(
+                data, accepted_media_type, renderer_context)
+
+        for separator, escaped in LINE_SEPARATORS:
+            ret = ret.replace(separator, escaped)
+
+        return ret
@@ -0,0 +1,91 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count
+
+from recipes.catalog import INGREDIENTS, get_catalog_version
+from recipes.models import Ingredient
+
+IndexSnapshot = namedtuple(
+    'IndexSnapshot', ('version', 'built', 'keys', 'ranks', 'items'))
+
+
+class IngredientPrefixIndex:
+    """Индекс для поиска ингредиентов по началу названия в памяти процесса.
+
+    Индекс — неизменяемый снимок справочника: названия в нижнем регистре
+    отсортированы, поэтому подходящие под префикс ингредиенты занимают
+    непрерывный диапазон, который находится двоичным поиском. Из диапазона
+    выбираются limit ингредиентов с наименьшим рангом; ранг задается
+    частотой использования ингредиента в рецептах, затем названием.
+
+    Снимок строится лениво и перестраивается, когда меняется версия
+    справочника ингредиентов или истекает ttl (так подтягиваются изменения
+    популярности и версии, обновленные в других процессах).
+    """
+
+    def __init__(self, limit, ttl):
+        self.limit = limit
+        self.ttl = ttl
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build(version):
+        # С основной БД: снимок с отставшей реплики жил бы до истечения ttl
+        # под новой версией справочника.
+        rows = Ingredient.objects.using('default').annotate(
+            popularity=Count('ingredientreciperelation')
+        ).values_list('id', 'name', 'measurement_unit', 'popularity')
+
+        ranked = sorted(rows, key=lambda row: (-row[3], row[1], row[0]))
+        entries = sorted(
+            (name.lower(), rank, {
+                'id': pk, 'name': name, 'measurement_unit': unit})
+            for rank, (pk, name, unit, _) in enumerate(ranked))
+
+        return IndexSnapshot(
+            version=version, built=time.monotonic(),
+            keys=tuple(entry[0] for entry in entries),
+            ranks=tuple(entry[1] for entry in entries),
+            items=tuple(entry[2] for entry in entries))
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def is_stale(self, snapshot, version):
+        return (
+            snapshot is None or snapshot.version != version
+            or time.monotonic() - snapshot.built > self.ttl)
+
+    def get_snapshot(self):
+        version = get_catalog_version(INGREDIENTS)
+
+        if self.is_stale(self._snapshot, version):
+            with self._lock:
+                if self.is_stale(self._snapshot, version):
+                    self._snapshot = self.build(version)
+
+        return self._snapshot
+
+    def search(self, prefix, limit=None):
+        snapshot = self.get_snapshot()
+        prefix = prefix.lower()
+
+        start = bisect_left(snapshot.keys, prefix)
+        end = bisect_right(snapshot.keys, prefix + chr(0x10FFFF), lo=start)
+
+        positions = heapq.nsmallest(
+            limit or self.limit, range(start, end),
+            key=snapshot.ranks.__getitem__)
+
+        return [snapshot.items[position] for position in positions]
+
+
+ingredient_index = IngredientPrefixIndex(
+    limit=settings.INGREDIENT_SEARCH_LIMIT,
+    ttl=settings.INGREDIENT_INDEX_TTL)
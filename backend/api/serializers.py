@@ -1,11 +1,19 @@
 import djoser.serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import transaction
-from django.shortcuts import get_object_or_404
+from django.db import models, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers
 from rest_framework.settings import api_settings
 
-from api.fields import ImageBase64Field
+from api.fields import ImageBase64Field, ImageRenditionsField
+from api.sparse import SparseFieldsMixin
+from recipes.cart_totals import (
+    add_recipe_to_totals,
+    subtract_recipe_from_totals,
+)
+from recipes.membership import is_member
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -33,11 +41,11 @@ class AuthorSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
-        if not self.context['request'].user.is_authenticated:
-            return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
 
-        return Subscription.objects.filter(
-            author=obj, user=self.context['request'].user).exists()
+        return is_member(
+            self.context['request'], Subscription, obj.pk)
 
     class Meta:
         fields = (
@@ -71,33 +79,32 @@ class IngredientRecipeRelationSerializer(serializers.ModelSerializer):
         model = IngredientRecipeRelation
 
 
-class RecipeSerializerList(serializers.ModelSerializer):
+class RecipeSerializerList(SparseFieldsMixin, serializers.ModelSerializer):
     author = AuthorSerializer(required=False, many=False, read_only=True)
     tags = TagSerializer(required=False, many=True, read_only=True)
     ingredients = serializers.SerializerMethodField()
+    image_renditions = ImageRenditionsField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
-    def __is_recipe(self, obj, model):
-        if not self.context['request'].user.is_authenticated:
-            return False
+    def __is_recipe(self, obj, model, annotation):
+        if hasattr(obj, annotation):
+            return getattr(obj, annotation)
 
-        return model.objects.filter(
-            recipe=obj, user=self.context['request'].user).exists()
+        return is_member(self.context['request'], model, obj.pk)
 
     def get_is_in_shopping_cart(self, obj):
-        return self.__is_recipe(obj, ShoppingCart)
+        return self.__is_recipe(obj, ShoppingCart, 'is_in_shopping_cart')
 
     def get_is_favorited(self, obj):
-        return self.__is_recipe(obj, Favorite)
+        return self.__is_recipe(obj, Favorite, 'is_favorited')
 
     def get_ingredients(self, obj):
         return IngredientRecipeRelationSerializer(
-            IngredientRecipeRelation.objects.filter(recipe=obj).all(),
-            many=True).data
+            obj.ingredientreciperelation_set.all(), many=True).data
 
     class Meta:
-        exclude = ('created', )
+        exclude = ('created', 'favorites_count', 'shopping_cart_count')
         model = Recipe
 
 
@@ -110,44 +117,40 @@ class RecipeCreateIngredientSerializer(serializers.ModelSerializer):
         model = IngredientRecipeRelation
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
         if 'request' not in self.context:
             return False
 
-        if not self.context['request'].user.is_authenticated:
-            return False
-
-        return Subscription.objects.filter(
-            author=obj, user=self.context['request'].user).exists()
+        return is_member(
+            self.context['request'], Subscription, obj.pk)
 
     class Meta:
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
-                  'is_subscribed')
+                  'is_subscribed', 'followers_count', 'following_count')
         model = User
 
 
 class RecipeShortSerilizer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField()
+
     class Meta:
-        fields = ('id', 'image', 'name', 'cooking_time')
+        fields = ('id', 'image', 'image_renditions', 'name', 'cooking_time')
         model = Recipe
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     ingredients = RecipeCreateIngredientSerializer(many=True)
     image = ImageBase64Field()
+    image_renditions = ImageRenditionsField()
     author = CustomUserSerializer(required=False)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     def __is_recipe(self, obj, model):
-        if not self.context['request'].user.is_authenticated:
-            return False
-
-        return model.objects.filter(
-            recipe=obj, user=self.context['request'].user).exists()
+        return is_member(self.context['request'], model, obj.pk)
 
     def get_is_in_shopping_cart(self, obj):
         return self.__is_recipe(obj, ShoppingCart)
@@ -157,7 +160,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         ingredients = set()
-        for ingredient in data['ingredients']:
+        for ingredient in data.get('ingredients', ()):
             if ingredient['ingredient'] in ingredients:
                 raise serializers.ValidationError(
                     'Ингредиент в рецепте не должен повторяться.'
@@ -165,33 +168,72 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             ingredients.add(ingredient['ingredient'])
         return data
 
+    @staticmethod
+    def __create_ingredients(recipe, ingredients):
+        IngredientRecipeRelation.objects.bulk_create(
+            IngredientRecipeRelation(
+                recipe=recipe, ingredient=ingredient['ingredient'],
+                amount=ingredient['amount'])
+            for ingredient in ingredients)
+
+    @staticmethod
+    def __update_ingredients(recipe, ingredients):
+        """Применяет к рецепту только отличия в наборе ингредиентов."""
+        amounts = {
+            ingredient['ingredient'].pk: ingredient['amount']
+            for ingredient in ingredients
+        }
+        changed = []
+        removed = []
+
+        for relation in recipe.ingredientreciperelation_set.all():
+            amount = amounts.pop(relation.ingredient_id, None)
+            if amount is None:
+                removed.append(relation.pk)
+            elif amount != relation.amount:
+                relation.amount = amount
+                changed.append(relation)
+
+        if not (removed or changed or amounts):
+            return
+
+        # Итоги списков покупок с этим рецептом пересчитываются: старые
+        # количества вычитаются, новые прибавляются.
+        subtract_recipe_from_totals(recipe.pk)
+
+        if removed:
+            IngredientRecipeRelation.objects.filter(pk__in=removed).delete()
+
+        if changed:
+            IngredientRecipeRelation.objects.bulk_update(changed, ('amount',))
+
+        if amounts:
+            IngredientRecipeRelation.objects.bulk_create(
+                IngredientRecipeRelation(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+                for ingredient_id, amount in amounts.items())
+
+        add_recipe_to_totals(recipe.pk)
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         obj = Recipe.objects.create(**validated_data)
-        obj.tags.set(tags)
-        for ingredient in ingredients:
-            IngredientRecipeRelation.objects.create(
-                recipe=obj, ingredient=ingredient['ingredient'],
-                amount=ingredient['amount']
-            ).save()
+        obj.tags.add(*tags)
+        self.__create_ingredients(obj, ingredients)
         return obj
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        super().update(instance, validated_data)
-        instance.tags.set(tags)
-        instance.image = validated_data.get('image', instance.image)
-        instance.ingredients.clear()
-        for ingredient in ingredients:
-            IngredientRecipeRelation.objects.create(
-                recipe=instance, ingredient=ingredient['ingredient'],
-                amount=ingredient['amount']
-            ).save()
-        return super().update(instance, validated_data)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        instance = super().update(instance, validated_data)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self.__update_ingredients(instance, ingredients)
+        return instance
 
     def to_representation(self, instance):
         self.fields.pop('ingredients')
@@ -199,39 +241,139 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
         representation['ingredients'] = IngredientRecipeRelationSerializer(
             IngredientRecipeRelation.objects.filter(
-                recipe=instance).all(), many=True).data
+                recipe=instance).select_related('ingredient'), many=True).data
         return representation
 
     class Meta:
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_renditions',
+                  'text', 'cooking_time')
         model = Recipe
 
 
-class SubscriptionListSerializer(serializers.ModelSerializer):
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get(
+        'recipes_limit', api_settings.PAGE_SIZE)
+
+    try:
+        recipes_limit = int(recipes_limit)
+    except (TypeError, ValueError):
+        recipes_limit = -1
+
+    if recipes_limit < 0:
+        raise serializers.ValidationError(
+            {'recipes_limit': 'Должно быть неотрицательным целым числом.'})
+
+    return min(recipes_limit, settings.RECIPES_LIMIT_MAX)
+
+
+def get_recipe_ids(request):
+    """id рецептов из параметра ids=1,2,3 без повторов, в порядке запроса."""
+    try:
+        recipe_ids = [
+            int(value) for value in request.query_params.get(
+                'ids', '').split(',')]
+    except ValueError:
+        recipe_ids = []
+
+    if not recipe_ids or min(recipe_ids) < 1:
+        raise serializers.ValidationError(
+            {'ids': 'Передайте id рецептов через запятую.'})
+
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    if len(recipe_ids) > settings.RECIPES_BATCH_MAX:
+        raise serializers.ValidationError({'ids': (
+            f'Не больше {settings.RECIPES_BATCH_MAX} рецептов за запрос.')})
+
+    return recipe_ids
+
+
+class SubscriptionRecipesListSerializer(serializers.ListSerializer):
+    """Загружает рецепты всех авторов страницы одним запросом.
+
+    Для каждого автора берутся первые recipes_limit рецептов: рецепты
+    нумеруются оконной функцией ROW_NUMBER() в разрезе автора, а отбор по
+    номеру делается во внешнем запросе. Если поле recipes исключено из
+    ответа (?fields=, ?omit=), рецепты не загружаются.
+    """
+
+    def to_representation(self, data):
+        authors = data.all() if isinstance(data, models.Manager) else data
+        authors = list(authors)
+
+        if 'recipes' not in self.child.fields:
+            return super().to_representation(authors)
+
+        recipes_limit = get_recipes_limit(self.context['request'])
+        recipes = {author.pk: [] for author in authors}
+
+        if recipes and recipes_limit:
+            ranked = Recipe.objects.filter(author__in=recipes).annotate(
+                recipe_rank=Window(
+                    expression=RowNumber(), partition_by=F('author'),
+                    order_by=(F('created').desc(), F('id').desc())))
+            sql, params = ranked.query.sql_with_params()
+
+            # Порядок подзапроса во внешнем запросе не сохраняется, поэтому
+            # рецепты упорядочиваются по номеру явно.
+            for recipe in Recipe.objects.raw(
+                    f'SELECT * FROM ({sql}) ranked WHERE recipe_rank <= %s '
+                    f'ORDER BY author_id, recipe_rank',
+                    (*params, recipes_limit)):
+                recipes[recipe.author_id].append(recipe)
+
+        for author in authors:
+            author.recent_recipes = recipes[author.pk]
+
+        return super().to_representation(authors)
+
+
+class SubscriptionListSerializer(SparseFieldsMixin,
+                                 serializers.ModelSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipes.count', read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
     is_subscribed = serializers.SerializerMethodField()
 
     def get_recipes(self, obj):
-        recipes_limit = int(self.context['request'].GET.get(
-            'recipes_limit', api_settings.PAGE_SIZE))
-
-        user = get_object_or_404(User, pk=obj.pk)
-        recipes = Recipe.objects.filter(author=user)[:recipes_limit]
+        if hasattr(obj, 'recent_recipes'):
+            recipes = obj.recent_recipes
+        else:
+            recipes_limit = get_recipes_limit(self.context['request'])
+            recipes = Recipe.objects.filter(author=obj)[:recipes_limit]
 
         return RecipeShortSerilizer(recipes, many=True).data
 
     def get_is_subscribed(self, obj):
-        if not self.context['request'].user.is_authenticated:
-            return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
 
-        return Subscription.objects.filter(
-            author=obj, user=self.context['request'].user).exists()
+        return is_member(
+            self.context['request'], Subscription, obj.pk)
 
     class Meta:
         fields = ('id', 'email', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes_count', 'recipes')
+                  'is_subscribed', 'recipes_count', 'followers_count',
+                  'following_count', 'recipes')
+        list_serializer_class = SubscriptionRecipesListSerializer
         model = User
+
+
+class MembershipBatchSerializer(serializers.Serializer):
+    """id рецептов, которые нужно добавить в набор и удалить из него."""
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False,
+        default=list, max_length=settings.TOGGLE_BATCH_MAX)
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False,
+        default=list, max_length=settings.TOGGLE_BATCH_MAX)
+
+    def validate(self, data):
+        if not data['add'] and not data['remove']:
+            raise serializers.ValidationError(
+                'Укажите рецепты для добавления или удаления.')
+
+        if set(data['add']) & set(data['remove']):
+            raise serializers.ValidationError(
+                'Рецепт не может одновременно добавляться и удаляться.')
+
+        return data
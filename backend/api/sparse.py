@@ -0,0 +1,52 @@
+from collections import OrderedDict
+
+from rest_framework import permissions, serializers
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def get_sparse_fields(request, fields):
+    """Поля ответа с учетом параметров ?fields= и ?omit=.
+
+    fields=id,name оставляет только перечисленные поля, omit=text,tags
+    убирает перечисленные. Порядок полей не меняется, неизвестные имена
+    игнорируются. Параметры действуют только на чтение.
+    """
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return tuple(fields)
+
+    params = request.query_params
+    selected = tuple(fields)
+
+    if params.get(FIELDS_PARAM):
+        requested = set(params[FIELDS_PARAM].split(','))
+        selected = tuple(field for field in selected if field in requested)
+
+    if params.get(OMIT_PARAM):
+        omitted = set(params[OMIT_PARAM].split(','))
+        selected = tuple(
+            field for field in selected if field not in omitted)
+
+    return selected
+
+
+class SparseFieldsMixin:
+    """Сериализатор, отдающий только поля, выбранные ?fields= и ?omit=.
+
+    Невыбранные поля не вычисляются. Параметры относятся к объектам
+    ответа верхнего уровня, вложенные сериализаторы они не затрагивают.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        root = self.parent
+        if isinstance(root, serializers.ListSerializer):
+            root = root.parent
+
+        if root is not None:
+            return fields
+
+        selected = get_sparse_fields(self.context.get('request'), fields)
+
+        return OrderedDict((field, fields[field]) for field in selected)
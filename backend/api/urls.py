@@ -2,14 +2,17 @@ from django.urls import include, path
 from rest_framework import routers
 
 from api.views import (
+    DownloadShoppingCartView,
+    FavoriteBatchView,
     FavoriteManageView,
     IngredientViewSet,
     ListFollowViewSet,
     RecipeViewSet,
+    ShoppingCartBatchView,
     ShoppingCartManageView,
+    ShoppingCartTotalsView,
     SubscriptionsManageView,
     TagViewSet,
-    download_shopping_cart,
 )
 
 app_name = 'api'
@@ -28,8 +31,17 @@ subscriptions_urlpatterns = [
 ]
 recipe_additional_urlpatterns = [
     path(
-        'download_shopping_cart/', download_shopping_cart,
+        'download_shopping_cart/', DownloadShoppingCartView.as_view(),
         name='download_shopping_cart'),
+    path(
+        'shopping_cart/', ShoppingCartTotalsView.as_view(),
+        name='shopping_cart_totals'),
+    path(
+        'shopping_cart/batch/', ShoppingCartBatchView.as_view(),
+        name='shopping_cart_batch'),
+    path(
+        'favorite/batch/', FavoriteBatchView.as_view(),
+        name='favorites_batch'),
     path(
         '<int:pk>/shopping_cart/', ShoppingCartManageView.as_view(),
         name='shopping_cart'),
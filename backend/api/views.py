@@ -1,24 +1,47 @@
+from itertools import chain
+
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db.models import (
+    BooleanField,
+    F,
+    Prefetch,
+    Value,
+)
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, permissions, status, viewsets
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.views import APIView, Response
 
-from api.filters import IngredientsSearchFilter, RecipeFilter
-from api.mixins import ListRetrieveViewSet
-from api.pagination import CustomPageNumberPagination
-from api.pdf_utils import make_pdf
+from api.export_utils import EXPORT_FORMATS, make_export
+from api.filters import RecipeFilter
+from api.mixins import CatalogViewSet, FastListMixin
+from api.negotiation import IgnoreFormatContentNegotiation
+from api.pagination import (
+    FeedPagination,
+    RecipePagination,
+    SubscriptionPagination,
+)
+from api.pdf_utils import invalidate_pdf, make_pdf
 from api.permissions import RecipePermissions
+from api.readers import IngredientReader, RecipeReader, TagReader
+from api.renderers import ORJSONRenderer
+from api.search import ingredient_index
 from api.serializers import (
     IngredientSerializer,
+    MembershipBatchSerializer,
     RecipeCreateUpdateSerializer,
     RecipeSerializerList,
     RecipeShortSerilizer,
     SubscriptionListSerializer,
     TagSerializer,
+    get_recipe_ids,
+    get_recipes_limit,
 )
+from recipes.cart_totals import get_totals
+from recipes.catalog import INGREDIENTS, TAGS
+from recipes.feed import get_feed_queryset
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -28,37 +51,77 @@ from recipes.models import (
     Subscription,
     Tag,
 )
+from recipes.toggles import add_members, delete_recipe, remove_members
 
 User = get_user_model()
 
 
-class TagViewSet(ListRetrieveViewSet):
+class TagViewSet(CatalogViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    list_reader_class = TagReader
+    renderer_classes = (ORJSONRenderer, BrowsableAPIRenderer)
+    catalog = TAGS
 
     pagination_class = None
 
 
-class IngredientViewSet(ListRetrieveViewSet):
+class IngredientViewSet(CatalogViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-
-    filter_backends = (IngredientsSearchFilter,)
-    search_fields = ('^name',)
+    list_reader_class = IngredientReader
+    renderer_classes = (ORJSONRenderer, BrowsableAPIRenderer)
+    catalog = INGREDIENTS
+    # Поиск по name ранжируется по популярности, которая меняется без
+    # смены версии справочника.
+    unversioned_params = ('name',)
 
     pagination_class = None
 
+    def get_list_response(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+
+        if name:
+            return Response(ingredient_index.search(name))
+
+        return super().get_list_response(request, *args, **kwargs)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(FastListMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
+    list_reader_class = RecipeReader
+    renderer_classes = (ORJSONRenderer, BrowsableAPIRenderer)
 
     permission_classes = (RecipePermissions,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    pagination_class = CustomPageNumberPagination
+    pagination_class = RecipePagination
+
+    def get_queryset(self):
+        # Связанные данные и описание загружаются, только если они есть в
+        # ответе: ?fields= и ?omit= сокращают и поля, и запросы к БД.
+        fields = self.get_serializer().fields
+        queryset = Recipe.objects.all()
+
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'ingredientreciperelation_set',
+                queryset=IngredientRecipeRelation.objects.select_related(
+                    'ingredient')))
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        if 'text' not in fields:
+            queryset = queryset.defer('text')
+
+        if self.action == 'feed':
+            return get_feed_queryset(queryset, self.request.user)
+
+        return queryset
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed', 'batch'):
             return RecipeSerializerList
 
         return RecipeCreateUpdateSerializer
@@ -66,6 +129,36 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        delete_recipe(instance)
+
+    @action(detail=False, permission_classes=(permissions.IsAuthenticated,),
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Лента: рецепты авторов из подписок, от новых к старым."""
+        return self.list(request)
+
+    @action(detail=False)
+    def batch(self, request):
+        """Рецепты по списку id (?ids=3,1,2) в порядке запроса.
+
+        Отсутствующие рецепты пропускаются. Рецепты читаются так же, как в
+        списке, и одним запросом вместо запроса на каждый рецепт.
+        """
+        recipe_ids = get_recipe_ids(request)
+        position = {pk: index for index, pk in enumerate(recipe_ids)}
+        queryset = self.get_queryset().filter(pk__in=recipe_ids).order_by()
+
+        if self.list_reader_class is None:
+            recipes = sorted(queryset, key=lambda recipe: position[recipe.pk])
+            return Response(self.get_serializer(recipes, many=True).data)
+
+        reader = self.list_reader_class(request)
+        rows = sorted(
+            reader.get_rows(queryset), key=lambda row: position[row['id']])
+
+        return Response(reader.serialize(rows))
+
 
 class SubscriptionsManageView(APIView):
     permission_classes = (permissions.IsAuthenticated,)
@@ -73,6 +166,8 @@ class SubscriptionsManageView(APIView):
     def post(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
 
+        get_recipes_limit(request)
+
         author = get_object_or_404(User, pk=pk)
         user = request.user
 
@@ -81,13 +176,15 @@ class SubscriptionsManageView(APIView):
                 {'errors': 'Вы не можете подписываться на себя'},
                 status=status.HTTP_400_BAD_REQUEST)
 
-        if Subscription.objects.filter(author=author, user=user).exists():
+        # Повторную подписку отсекает ON CONFLICT DO NOTHING: так
+        # одновременные запросы не приводят к ошибке 500.
+        if not add_members(Subscription, user.pk, (author.pk,)):
             return Response(
                 {'errors': 'Вы уже подписаны на этого пользователя'},
                 status=status.HTTP_400_BAD_REQUEST)
-
-        obj = Subscription(author=author, user=user)
-        obj.save()
+        author.is_subscribed = True
+        # Счетчик в БД увеличен сигналом, объект автора загружен до этого.
+        author.followers_count += 1
 
         serializer = SubscriptionListSerializer(
             author, context={'request': request})
@@ -97,12 +194,8 @@ class SubscriptionsManageView(APIView):
     def delete(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
 
-        user = request.user
-        author = get_object_or_404(User, id=pk)
-
-        try:
-            Subscription.objects.get(author=author, user=user).delete()
-        except Subscription.DoesNotExist:
+        if not remove_members(Subscription, request.user.pk, (pk,)):
+            get_object_or_404(User, id=pk)
             return Response(
                 {'errors': 'Вы не подписаны на этого пользователя'},
                 status=status.HTTP_400_BAD_REQUEST)
@@ -114,30 +207,68 @@ class ListFollowViewSet(generics.ListAPIView):
     queryset = User.objects.all()
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = SubscriptionListSerializer
+    pagination_class = SubscriptionPagination
 
     def get_queryset(self):
         user = self.request.user
-        return User.objects.filter(subscripters__user=user)
+        return User.objects.filter(subscripters__user=user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()))
+
 
+class DownloadShoppingCartView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+    content_negotiation_class = IgnoreFormatContentNegotiation
+    header = ('Наименование', 'Количество', 'Ед.измерения')
 
-@api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
-def download_shopping_cart(request):
-    recipes = request.user.shopping_cart.all().values('recipe_id')
-    ingredients = IngredientRecipeRelation.objects.filter(recipe__in=recipes)
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('format', 'pdf')
 
-    if not ingredients:
-        return Response(
-            {'errors': 'Ваш список для покупок пустой'},
-            status=status.HTTP_204_NO_CONTENT)
+        if export_format != 'pdf' and export_format not in EXPORT_FORMATS:
+            return Response(
+                {'errors': 'Неподдерживаемый формат списка покупок'},
+                status=status.HTTP_400_BAD_REQUEST)
 
-    total_ingredients = ingredients.values(
-        'ingredient__name', 'ingredient__measurement_unit').order_by(
-        'ingredient__name').annotate(amount_total=Sum('amount'))
+        # Итоги уже посчитаны при изменении списка покупок (см.
+        # recipes.cart_totals), поэтому агрегировать ингредиенты не нужно.
+        total_ingredients = get_totals(request.user).values(
+            'ingredient__name', 'ingredient__measurement_unit',
+            amount_total=F('amount'))
 
-    return make_pdf(
-        ('Наименование', 'Количество', 'Ед.измерения'), total_ingredients,
-        'shoppingcart.pdf', status.HTTP_200_OK)
+        if export_format == 'pdf':
+            total_ingredients = list(total_ingredients)
+            first = total_ingredients[0] if total_ingredients else None
+        else:
+            total_ingredients = total_ingredients.iterator()
+            first = next(total_ingredients, None)
+
+        if first is None:
+            return Response(
+                {'errors': 'Ваш список для покупок пустой'},
+                status=status.HTTP_204_NO_CONTENT)
+
+        if export_format == 'pdf':
+            return make_pdf(
+                self.header, total_ingredients, 'shoppingcart.pdf',
+                status.HTTP_200_OK, owner=request.user.pk)
+
+        return make_export(
+            export_format, self.header, chain((first,), total_ingredients),
+            f'shoppingcart.{export_format}', status.HTTP_200_OK)
+
+
+class ShoppingCartTotalsView(APIView):
+    """Итоги списка покупок: ингредиенты и их суммарные количества."""
+    permission_classes = (permissions.IsAuthenticated,)
+    renderer_classes = (ORJSONRenderer, BrowsableAPIRenderer)
+
+    def get(self, request, *args, **kwargs):
+        return Response([
+            {'id': ingredient_id, 'name': name,
+             'measurement_unit': measurement_unit, 'amount': amount}
+            for ingredient_id, name, measurement_unit, amount
+            in get_totals(request.user).values_list(
+                'ingredient_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount')])
 
 
 class ShoppingCartManageView(APIView):
@@ -154,13 +285,13 @@ class ShoppingCartManageView(APIView):
         recipe = get_object_or_404(Recipe, pk=pk)
         user = request.user
 
-        if self.main_model.objects.filter(recipe=recipe, user=user).exists():
+        # Повторное добавление отсекает ON CONFLICT DO NOTHING: так
+        # одновременные запросы не приводят к ошибке 500.
+        if not add_members(self.main_model, user.pk, (recipe.pk,)):
             return Response(
                 {'errors': self.err_messages['recipe_in_list']},
                 status=status.HTTP_400_BAD_REQUEST)
-
-        obj = self.main_model(recipe=recipe, user=user)
-        obj.save()
+        self.on_change(user)
 
         serializer = RecipeShortSerilizer(recipe)
 
@@ -169,18 +300,19 @@ class ShoppingCartManageView(APIView):
     def delete(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
 
-        recipe = get_object_or_404(Recipe, id=pk)
-
-        try:
-            self.main_model.objects.get(
-                recipe=recipe, user=request.user).delete()
-        except self.main_model.DoesNotExist:
+        if not remove_members(self.main_model, request.user.pk, (pk,)):
+            get_object_or_404(Recipe, id=pk)
             return Response(
                 {'errors': self.err_messages['recipe_not_in_list']},
                 status=status.HTTP_400_BAD_REQUEST)
 
+        self.on_change(request.user)
+
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def on_change(self, user):
+        invalidate_pdf(user.pk)
+
 
 class FavoriteManageView(ShoppingCartManageView):
     main_model = Favorite
@@ -188,3 +320,41 @@ class FavoriteManageView(ShoppingCartManageView):
         'recipe_not_in_list': 'Этого рецепта нет в вашем избранном',
         'recipe_in_list': 'Этот рецепт уже в вашем избранном'
     }
+
+    def on_change(self, user):
+        pass
+
+
+class ShoppingCartBatchView(ShoppingCartManageView):
+    """Добавляет и удаляет несколько рецептов за один запрос.
+
+    Добавление и удаление выполняются одним запросом к БД каждое; уже
+    добавленные, отсутствующие в наборе и несуществующие рецепты
+    пропускаются. В ответе — id рецептов, которые действительно были
+    добавлены и удалены.
+    """
+    http_method_names = ('post', 'options')
+
+    def post(self, request, *args, **kwargs):
+        serializer = MembershipBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+
+        added = add_members(
+            self.main_model, user.pk, serializer.validated_data['add'])
+        removed = remove_members(
+            self.main_model, user.pk, serializer.validated_data['remove'])
+        if added or removed:
+            self.on_change(user)
+
+        return Response({
+            'added': sorted(instance.recipe_id for instance in added),
+            'removed': sorted(instance.recipe_id for instance in removed),
+        })
+
+
+class FavoriteBatchView(ShoppingCartBatchView):
+    main_model = Favorite
+
+    def on_change(self, user):
+        pass
@@ -0,0 +1,16 @@
+from rest_framework.authentication import TokenAuthentication
+
+from core.middleware import stick_to_primary
+
+
+class StickyTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с «чтением своих записей».
+
+    Недавно изменявший данные пользователь читает с основной БД, с какого
+    бы токена ни пришел запрос (см. core.middleware).
+    """
+
+    def authenticate_credentials(self, key):
+        user, token = super().authenticate_credentials(key)
+        stick_to_primary(user)
+        return user, token
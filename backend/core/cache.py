@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш в памяти процесса.
+
+    Объем кэша ограничен суммой размеров значений (sizeof, по умолчанию
+    len); при переполнении вытесняются давно не использованные записи, и
+    для каждой вызывается on_evict(key, value), если он задан.
+    """
+
+    def __init__(self, max_size, sizeof=len, on_evict=None):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            if key in self._data:
+                self.size -= self.sizeof(self._data.pop(key))
+
+            self._data[key] = value
+            self.size += size
+
+            evicted = []
+            while self.size > self.max_size:
+                evicted.append(self._data.popitem(last=False))
+                self.size -= self.sizeof(evicted[-1][1])
+
+        if self.on_evict is not None:
+            for evicted_key, evicted_value in evicted:
+                self.on_evict(evicted_key, evicted_value)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self.size -= self.sizeof(self._data.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
@@ -0,0 +1,84 @@
+from django.db import NotSupportedError
+from django.db.models import Expression, Field, FloatField, Lookup
+
+
+class SearchDocumentField(Field):
+    """Документ полнотекстового индекса в таблице, которую создает миграция.
+
+    В PostgreSQL это столбец tsvector, в SQLite документом служит вся
+    строка таблицы FTS5. config — конфигурация текстового поиска
+    PostgreSQL для запросов.
+    """
+
+    def __init__(self, *args, config='simple', **kwargs):
+        self.config = config
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['config'] = self.config
+        return name, path, args, kwargs
+
+    def db_type(self, connection):
+        return 'tsvector'
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    """document__match=query: документ подходит под запрос.
+
+    В PostgreSQL запрос разбирается plainto_tsquery, в SQLite передается
+    в MATCH как есть (в синтаксисе запросов FTS5).
+    """
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        raise NotSupportedError(
+            f'Полнотекстовый поиск не поддерживается в {connection.vendor}')
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return (
+            f'{lhs} @@ plainto_tsquery(%s::regconfig, {rhs})',
+            [*lhs_params, self.lhs.output_field.config, *rhs_params])
+
+    def as_sqlite(self, compiler, connection):
+        # Левая часть MATCH в FTS5 — имя таблицы: так ищется по всем
+        # столбцам индекса.
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return (
+            f'{connection.ops.quote_name(self.lhs.alias)} MATCH {rhs}',
+            rhs_params)
+
+
+class SearchRank(Expression):
+    """Релевантность документа запросу, чем больше, тем выше.
+
+    Запрос должен совпадать с запросом в фильтре document__match: в SQLite
+    ранг берется из столбца rank, который FTS5 считает для найденных строк.
+    """
+
+    def __init__(self, document, query):
+        super().__init__(output_field=FloatField())
+        self.document = document
+        self.query = query
+
+    def get_source_expressions(self):
+        return [self.document]
+
+    def set_source_expressions(self, exprs):
+        self.document, = exprs
+
+    def as_sql(self, compiler, connection):
+        raise NotSupportedError(
+            f'Полнотекстовый поиск не поддерживается в {connection.vendor}')
+
+    def as_postgresql(self, compiler, connection):
+        sql, params = compiler.compile(self.document)
+        return (
+            f'ts_rank({sql}, plainto_tsquery(%s::regconfig, %s))',
+            [*params, self.document.output_field.config, self.query])
+
+    def as_sqlite(self, compiler, connection):
+        return f'-{connection.ops.quote_name(self.document.alias)}.rank', []
@@ -1,4 +1,14 @@
 import hashlib
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+INVALID_IMAGE = 'Загрузите корректное изображение.'
+RENDITIONS_DIR = 'renditions'
 
 
 def upload_to(instance, filename):
@@ -13,3 +23,124 @@ def upload_to(instance, filename):
     f3 = fname[4:]
 
     return f'{class_folder}/{f1}/{f2}/{f3}.{extension}'
+
+
+def check_image_size(size):
+    if size > settings.IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Размер изображения не должен превышать {} МБ.'.format(
+                settings.IMAGE_MAX_BYTES // (1024 * 1024)))
+
+
+def normalize_image(data):
+    """Проверяет загруженное изображение и перекодирует его.
+
+    Изображение декодируется один раз, поворачивается по EXIF, уменьшается
+    до IMAGE_MAX_SIDE и сохраняется в IMAGE_FORMAT без метаданных.
+    Возвращает байты и расширение файла.
+    """
+    check_image_size(len(data))
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        width, height = image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Изображение не должно быть больше {} Мпикс.'.format(
+                    settings.IMAGE_MAX_PIXELS // 10**6))
+        image.load()
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ValidationError(INVALID_IMAGE)
+
+    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.thumbnail(
+        (settings.IMAGE_MAX_SIDE, settings.IMAGE_MAX_SIDE), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    image.save(
+        buffer, settings.IMAGE_FORMAT, quality=settings.IMAGE_QUALITY,
+        optimize=True)
+
+    return buffer.getvalue(), settings.IMAGE_FORMAT.lower()
+
+
+def get_rendition_name(name, geometry):
+    """Имя файла уменьшенной копии изображения name размера geometry.
+
+    Имя определяется именем изображения и размером, поэтому ссылку на копию
+    можно получить без обращения к хранилищу и кэшу.
+    """
+    stem = os.path.splitext(name)[0]
+    extension = settings.IMAGE_FORMAT.lower()
+
+    return f'{RENDITIONS_DIR}/{geometry}/{stem}.{extension}'
+
+
+def get_rendition_names(name):
+    """Имена уменьшенных копий изображения по названиям размеров."""
+    return {
+        rendition: get_rendition_name(name, geometry)
+        for rendition, geometry in settings.IMAGE_RENDITIONS.items()
+    }
+
+
+def resize_to_fill(image, width, height):
+    """Уменьшает изображение до заполнения рамки и обрезает по центру.
+
+    Изображение меньше рамки не увеличивается, а только обрезается.
+    """
+    factor = min(1, max(width / image.width, height / image.height))
+    if factor < 1:
+        image = image.resize(
+            (round(image.width * factor), round(image.height * factor)),
+            Image.LANCZOS)
+
+    width, height = min(width, image.width), min(height, image.height)
+    left = (image.width - width) // 2
+    top = (image.height - height) // 2
+
+    return image.crop((left, top, left + width, top + height))
+
+
+def make_renditions(image, overwrite=False):
+    """Создает уменьшенные копии изображения из IMAGE_RENDITIONS.
+
+    Копии сохраняются в хранилище изображения под именами из
+    get_rendition_names; существующие копии пропускаются, если не задан
+    overwrite. Возвращает число созданных копий.
+    """
+    storage = image.storage
+    names = {
+        geometry: get_rendition_name(image.name, geometry)
+        for geometry in settings.IMAGE_RENDITIONS.values()}
+    if not overwrite:
+        names = {
+            geometry: name for geometry, name in names.items()
+            if not storage.exists(name)}
+
+    if not names:
+        return 0
+
+    with storage.open(image.name) as file:
+        original = Image.open(file)
+        original.load()
+
+    for geometry, name in names.items():
+        width, height = map(int, geometry.split('x'))
+        buffer = io.BytesIO()
+        resize_to_fill(original, width, height).save(
+            buffer, settings.IMAGE_FORMAT, quality=settings.IMAGE_QUALITY)
+
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(name, ContentFile(buffer.getvalue()))
+
+    return len(names)
+
+
+def delete_renditions(storage, name):
+    """Удаляет уменьшенные копии изображения name из хранилища storage."""
+    for rendition_name in get_rendition_names(name).values():
+        storage.delete(rendition_name)
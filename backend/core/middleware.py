@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from core.routers import read_from_replicas
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_KEY = 'db_sticky:{}'
+
+
+def get_sticky_key(user_id):
+    """Ключ «чтения своих записей» пользователя."""
+    return STICKY_KEY.format(user_id)
+
+
+def stick_to_primary(user):
+    """Переводит чтение на основную БД, если user недавно что-то изменил.
+
+    Вызывается после аутентификации запроса (см. core.authentication):
+    пользователь известен только после нее, а до нее с БД ничего не
+    читается.
+    """
+    if (settings.DATABASE_REPLICAS and read_from_replicas.get()
+            and cache.get(get_sticky_key(user.pk))):
+        read_from_replicas.set(False)
+
+
+class ReplicaRoutingMiddleware:
+    """Разрешает чтение с реплик для безопасных запросов к API.
+
+    После успешной записи пользователь (с любого токена и устройства) на
+    REPLICA_STICKY_SECONDS секунд закрепляется за основной БД, чтобы сразу
+    видеть свои изменения.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (not settings.DATABASE_REPLICAS
+                or not request.path.startswith('/api/')):
+            return self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            # DRF переносит аутентифицированного пользователя в request.
+            user = getattr(request, 'user', None)
+            if (user is not None and user.is_authenticated
+                    and response.status_code < 400):
+                cache.set(
+                    get_sticky_key(user.pk), True,
+                    settings.REPLICA_STICKY_SECONDS)
+            return response
+
+        token = read_from_replicas.set(True)
+        try:
+            return self.get_response(request)
+        finally:
+            read_from_replicas.reset(token)
@@ -1,9 +1,14 @@
+import functools
 import os
 
-from fpdf import FPDF
+from fpdf import FPDF, set_global
 
 from foodgram.settings import BASE_DIR
 
+# Метрики шрифтов кэшируются в памяти процесса (load_fonts), поэтому fpdf
+# не нужно сохранять .pkl файлы рядом со шрифтами.
+set_global('FPDF_CACHE_MODE', 1)
+
 
 class Constant:
     DT_CAPTION = 1
@@ -12,6 +17,20 @@ class Constant:
     DT_FOOTER = 4
 
 
+@functools.lru_cache(maxsize=None)
+def load_fonts(*fonts):
+    """Разбирает TTF файлы один раз на процесс.
+
+    fonts — пары (семейство, путь к .ttf). Возвращает словари fonts и
+    font_files, заполненные FPDF.add_font, для копирования в документы.
+    """
+    prototype = FPDF()
+    for family, filename in fonts:
+        prototype.add_font(family, '', filename, uni=True)
+
+    return prototype.fonts, prototype.font_files
+
+
 class PDFMaker(FPDF):
     font_regular_name = 'DejaVuSansCondensed.ttf'
     font_regular_family = 'DejaVu'
@@ -64,8 +83,27 @@ class PDFMaker(FPDF):
 
         self.set_auto_page_break(1)
         self.add_page()
-        self.add_font(self.font_regular_family, '', font_regular, uni=True)
-        self.add_font(self.font_bold_family, '', font_bold, uni=True)
+        self.__add_fonts(
+            (self.font_regular_family, font_regular),
+            (self.font_bold_family, font_bold))
+
+    def __add_fonts(self, *fonts):
+        loaded_fonts, font_files = load_fonts(*fonts)
+
+        # Таблица ширин символов (cw) только читается и общая для всех
+        # документов, а набор используемых символов (subset) у каждого свой.
+        for key, font in loaded_fonts.items():
+            self.fonts[key] = dict(
+                font, i=len(self.fonts) + 1, subset=list(font['subset']))
+
+        for key, font_file in font_files.items():
+            self.font_files[key] = dict(font_file)
+
+    def _putTTfontwidths(self, font, maxUni):  # noqa: N802, N803
+        # fpdf проверяет вхождение каждого символа шрифта в subset; для
+        # списка это линейный поиск, для множества — константный.
+        super()._putTTfontwidths(
+            dict(font, subset=set(font['subset'])), maxUni)
 
     def __font_size(self, line_type):
         return self.font_sizes.get(line_type, self.default_font_size)
@@ -0,0 +1,35 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Разрешено ли читать с реплик в текущем запросе; выставляется
+# ReplicaRoutingMiddleware.
+read_from_replicas = ContextVar('read_from_replicas', default=False)
+
+# Модели, которые всегда читаются с основной БД: новый токен должен
+# работать сразу, не дожидаясь репликации.
+PRIMARY_ONLY_MODELS = {'authtoken.Token'}
+
+
+class ReplicaRouter:
+    """Направляет чтение безопасных запросов API на реплики.
+
+    Запись и чтение вне таких запросов всегда идут в основную БД
+    ('default'). Если реплики не настроены, роутер ничего не меняет.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (settings.DATABASE_REPLICAS and read_from_replicas.get()
+                and model._meta.label not in PRIMARY_ONLY_MODELS):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
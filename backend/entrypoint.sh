@@ -1,3 +1,4 @@
 python manage.py collectstatic --noinput
 python manage.py migrate
-gunicorn foodgram.wsgi:application --bind 0:8000
\ No newline at end of file
+python manage.py makerenditions
+gunicorn foodgram.wsgi:application -c gunicorn.conf.py
\ No newline at end of file
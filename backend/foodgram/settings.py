@@ -1,5 +1,6 @@
 import os
 import sys
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -40,6 +41,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -65,7 +67,7 @@ TEMPLATES = [
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 
-if os.path.basename(sys.argv[0]) == 'manage.py':
+if os.path.basename(sys.argv[0]) == 'manage.py' and not os.getenv('DB_ENGINE'):
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
@@ -81,10 +83,50 @@ else:
             'USER': os.getenv('POSTGRES_USER', default='postgres'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
             'HOST': os.getenv('DB_HOST', default='db'),
-            'PORT': os.getenv('DB_PORT', default=5432)
+            'PORT': os.getenv('DB_PORT', default=5432),
+            # Соединения переиспользуются между запросами одного потока.
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
         }
     }
 
+# Реплики для чтения: для PostgreSQL — хосты (host[:port]), для SQLite —
+# пути к файлам копий базы, через пробел.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(os.getenv('DB_REPLICAS', '').split()):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES[alias]['NAME'] = replica
+    else:
+        host, _, port = replica.partition(':')
+        DATABASES[alias].update(
+            HOST=host, PORT=port or DATABASES[alias]['PORT'])
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 10))
+
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram_cache')),
+    }
+}
+# В кэше лежат версии справочников, наборы избранного, списков покупок и
+# подписок каждого пользователя, метки чтения с основной БД и хранилище
+# sorl-thumbnail (миниатюры в админке). Файловый кэш и кэш в памяти при
+# переполнении удаляют треть записей, поэтому их размер задается с запасом;
+# у memcached размер задается самим сервером.
+if 'memcached' not in CACHES['default']['BACKEND']:
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+    }
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -121,7 +163,7 @@ AUTH_USER_MODEL = 'users.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'core.authentication.StickyTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -130,6 +172,40 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
 }
 
+RECIPES_LIMIT_MAX = 50
+RECIPES_BATCH_MAX = 100
+
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_INDEX_TTL = 300
+
+CATALOG_CACHE_MAX_AGE = 60
+
+PDF_CACHE_MAX_SIZE = 32 * 1024 * 1024
+PDF_CACHE_MAX_OWNERS = 10000
+
+MEMBERSHIP_CACHE_TTL = 600
+
+# Сколько рецептов можно добавить (и удалить) одним пакетным запросом.
+TOGGLE_BATCH_MAX = 100
+
+RECIPE_SEARCH_CONFIG = 'russian'
+
+# Лента подписок хранится в таблице только у пользователей, подписанных не
+# более чем на столько авторов; для остальных она собирается из рецептов
+# авторов при чтении.
+FEED_TIMELINE_MAX_FOLLOWING = 1000
+
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 50 * 10**6
+IMAGE_MAX_SIDE = 2048
+IMAGE_FORMAT = 'WEBP'
+IMAGE_QUALITY = 80
+IMAGE_RENDITIONS = {
+    'card': '480x320',
+    'detail': '960x640',
+    'retina': '1920x1280',
+}
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'PERMISSIONS': {
@@ -0,0 +1,11 @@
+import os
+
+# Потоковые воркеры: пока один запрос ждет ответа БД, тот же процесс
+# обслуживает другие. Число одновременных запросов на процесс ограничено
+# пулом из GUNICORN_THREADS потоков.
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
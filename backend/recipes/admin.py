@@ -1,6 +1,10 @@
 from django.contrib import admin
 from sorl.thumbnail.admin import AdminImageMixin
 
+from recipes.cart_totals import (
+    add_recipe_to_totals,
+    subtract_recipe_from_totals,
+)
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -10,6 +14,7 @@ from recipes.models import (
     Subscription,
     Tag,
 )
+from recipes.toggles import delete_recipe
 
 
 class FavoriteAdmin(admin.ModelAdmin):
@@ -30,7 +35,7 @@ class IngredientRecipeRelationAdminInline(admin.TabularInline):
 
 
 class RecipeAdmin(AdminImageMixin, admin.ModelAdmin):
-    list_display = ('name', 'author', 'favorite_count')
+    list_display = ('name', 'author', 'favorites_count')
     search_fields = ('name', 'author__username', 'author__last_name',
                      'tags__name', 'tags__slug', 'author__first_name')
     inlines = (IngredientRecipeRelationAdminInline,)
@@ -43,7 +48,7 @@ class RecipeAdmin(AdminImageMixin, admin.ModelAdmin):
         }),
         ('Информация', {
             'fields': (
-                'favorite_count', 'shoppingcart_count'
+                'favorites_count', 'shopping_cart_count'
             )
         }),
         ('Приготовление', {
@@ -52,16 +57,33 @@ class RecipeAdmin(AdminImageMixin, admin.ModelAdmin):
             )
         }),
     )
-    readonly_fields = ('favorite_count', 'shoppingcart_count')
+    readonly_fields = ('favorites_count', 'shopping_cart_count')
+
+    def get_readonly_fields(self, request, obj=None):
+        # Смена автора не переносит счетчики рецептов и ленты подписчиков,
+        # поэтому автор задается только при создании рецепта.
+        if obj is not None:
+            return (*self.readonly_fields, 'author')
+
+        return self.readonly_fields
+
+    def save_related(self, request, form, formsets, change):
+        # Ингредиенты меняются во вложенной форме, поэтому итоги списков
+        # покупок с этим рецептом пересчитываются вокруг ее сохранения.
+        if change:
+            subtract_recipe_from_totals(form.instance.pk)
+
+        super().save_related(request, form, formsets, change)
 
-    def favorite_count(self, obj):
-        return obj.favorites.count()
+        if change:
+            add_recipe_to_totals(form.instance.pk)
 
-    def shoppingcart_count(self, obj):
-        return obj.shopping_cart.count()
+    def delete_model(self, request, obj):
+        delete_recipe(obj)
 
-    favorite_count.short_description = 'В избранном'
-    shoppingcart_count.short_description = 'В списке покупок'
+    def delete_queryset(self, request, queryset):
+        for recipe in queryset:
+            delete_recipe(recipe)
 
 
 class IngredeintAdmin(admin.ModelAdmin):
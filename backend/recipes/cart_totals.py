@@ -0,0 +1,139 @@
+from django.db import connection
+
+from recipes.models import (
+    IngredientRecipeRelation,
+    ShoppingCart,
+    ShoppingCartTotal,
+)
+
+
+def _get_tables():
+    quote_name = connection.ops.quote_name
+    return (
+        quote_name(ShoppingCartTotal._meta.db_table),
+        quote_name(IngredientRecipeRelation._meta.db_table),
+        quote_name(ShoppingCart._meta.db_table),
+    )
+
+
+def get_totals(user):
+    """Итоги списка покупок пользователя по названиям ингредиентов."""
+    return ShoppingCartTotal.objects.filter(user=user).order_by(
+        'ingredient__name', 'ingredient__measurement_unit')
+
+
+def add_recipe_to_totals(recipe_id, user_id=None):
+    """Прибавляет ингредиенты рецепта к итогам списков покупок.
+
+    Если user_id не задан, меняются итоги всех пользователей, у которых
+    рецепт в списке покупок.
+    """
+    if user_id is not None:
+        add_recipes_to_totals((recipe_id,), user_id)
+        return
+
+    table, relations, cart = _get_tables()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} '
+            f'(user_id, ingredient_id, amount, recipes_count) '
+            f'SELECT c.user_id, ri.ingredient_id, ri.amount, 1 '
+            f'FROM {cart} c JOIN {relations} ri ON ri.recipe_id = c.recipe_id '
+            f'WHERE ri.recipe_id = %s '
+            f'ON CONFLICT (user_id, ingredient_id) DO UPDATE SET '
+            f'amount = {table}.amount + EXCLUDED.amount, '
+            f'recipes_count = {table}.recipes_count + 1', [recipe_id])
+
+
+def subtract_recipe_from_totals(recipe_id, user_id=None):
+    """Вычитает ингредиенты рецепта из итогов списков покупок.
+
+    Пользователи выбираются так же, как в add_recipe_to_totals.
+    Ингредиенты, которых не осталось ни в одном рецепте списка, удаляются
+    из итогов.
+    """
+    if user_id is not None:
+        subtract_recipes_from_totals((recipe_id,), user_id)
+        return
+
+    table, relations, cart = _get_tables()
+    users = f'user_id IN (SELECT user_id FROM {cart} WHERE recipe_id = %s)'
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET '
+            f'amount = amount - (SELECT ri.amount FROM {relations} ri '
+            f'WHERE ri.recipe_id = %s '
+            f'AND ri.ingredient_id = {table}.ingredient_id), '
+            f'recipes_count = recipes_count - 1 '
+            f'WHERE ingredient_id IN (SELECT ingredient_id FROM {relations} '
+            f'WHERE recipe_id = %s) AND {users}',
+            [recipe_id, recipe_id, recipe_id])
+        cursor.execute(
+            f'DELETE FROM {table} WHERE recipes_count <= 0 AND {users}',
+            [recipe_id])
+
+
+def add_recipes_to_totals(recipe_ids, user_id):
+    """Прибавляет ингредиенты рецептов к итогам списка покупок user_id.
+
+    Ингредиенты всех рецептов суммируются одним запросом.
+    """
+    table, relations, _ = _get_tables()
+    recipe_ids = list(recipe_ids)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} '
+            f'(user_id, ingredient_id, amount, recipes_count) '
+            f'SELECT %s, ri.ingredient_id, SUM(ri.amount), COUNT(*) '
+            f'FROM {relations} ri WHERE ri.recipe_id IN ({placeholders}) '
+            f'GROUP BY ri.ingredient_id '
+            f'ON CONFLICT (user_id, ingredient_id) DO UPDATE SET '
+            f'amount = {table}.amount + EXCLUDED.amount, '
+            f'recipes_count = {table}.recipes_count + EXCLUDED.recipes_count',
+            [user_id, *recipe_ids])
+
+
+def subtract_recipes_from_totals(recipe_ids, user_id):
+    """Вычитает ингредиенты рецептов из итогов списка покупок user_id.
+
+    Ингредиенты, которых не осталось ни в одном рецепте списка, удаляются
+    из итогов.
+    """
+    table, relations, _ = _get_tables()
+    recipe_ids = list(recipe_ids)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    recipe_ingredient = (
+        f'FROM {relations} ri WHERE ri.recipe_id IN ({placeholders}) '
+        f'AND ri.ingredient_id = {table}.ingredient_id')
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET '
+            f'amount = amount - (SELECT SUM(ri.amount) {recipe_ingredient}), '
+            f'recipes_count = recipes_count - '
+            f'(SELECT COUNT(*) {recipe_ingredient}) '
+            f'WHERE user_id = %s AND ingredient_id IN '
+            f'(SELECT ingredient_id FROM {relations} '
+            f'WHERE recipe_id IN ({placeholders}))',
+            [*recipe_ids, *recipe_ids, user_id, *recipe_ids])
+        cursor.execute(
+            f'DELETE FROM {table} WHERE recipes_count <= 0 AND user_id = %s',
+            [user_id])
+
+
+def rebuild_totals():
+    """Пересчитывает итоги всех списков покупок по их рецептам."""
+    table, relations, cart = _get_tables()
+
+    ShoppingCartTotal.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} '
+            f'(user_id, ingredient_id, amount, recipes_count) '
+            f'SELECT c.user_id, ri.ingredient_id, SUM(ri.amount), COUNT(*) '
+            f'FROM {cart} c JOIN {relations} ri ON ri.recipe_id = c.recipe_id '
+            f'GROUP BY c.user_id, ri.ingredient_id')
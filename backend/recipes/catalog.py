@@ -0,0 +1,52 @@
+import time
+
+from django.core.cache import cache
+
+from recipes.models import Tag
+
+CATALOG_VERSION_KEY = 'catalog_version:{}'
+TAG_IDS_KEY = 'tag_ids:{}'
+
+INGREDIENTS = 'ingredients'
+TAGS = 'tags'
+
+
+def get_catalog_version(catalog):
+    """Возвращает текущую версию справочника.
+
+    Версия — время последнего изменения справочника в наносекундах. Она
+    хранится в кэше Django и меняется при каждом изменении данных
+    справочника, поэтому ее можно сверять без обращения к БД.
+    """
+    key = CATALOG_VERSION_KEY.format(catalog)
+    version = cache.get(key)
+
+    if version is not None:
+        return version
+
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def bump_catalog_version(catalog):
+    cache.set(
+        CATALOG_VERSION_KEY.format(catalog), time.time_ns(), timeout=None)
+
+
+def get_tag_ids(slugs):
+    """Возвращает id тегов по их slug.
+
+    Соответствие slug -> id кэшируется вместе с версией справочника тегов
+    и сбрасывается при любом изменении тегов. Неизвестные slug
+    пропускаются.
+    """
+    key = TAG_IDS_KEY.format(get_catalog_version(TAGS))
+    tag_ids = cache.get(key)
+
+    if tag_ids is None:
+        # С основной БД: с реплики под новой версией могли бы закэшироваться
+        # старые теги.
+        tag_ids = dict(Tag.objects.using('default').values_list('slug', 'id'))
+        cache.set(key, tag_ids)
+
+    return [tag_ids[slug] for slug in slugs if slug in tag_ids]
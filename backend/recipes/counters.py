@@ -0,0 +1,56 @@
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscription
+
+User = get_user_model()
+
+# Модель-источник -> счетчики: (модель со счетчиком, поле счетчика,
+# внешний ключ источника).
+COUNTERS = {
+    Favorite: ((Recipe, 'favorites_count', 'recipe'),),
+    ShoppingCart: ((Recipe, 'shopping_cart_count', 'recipe'),),
+    Recipe: ((User, 'recipes_count', 'author'),),
+    Subscription: (
+        (User, 'followers_count', 'author'),
+        (User, 'following_count', 'user'),
+    ),
+}
+
+
+def change_counter(source, instance, delta):
+    """Атомарно меняет счетчики, к которым относится объект-источник."""
+    change_counters(source, (instance,), delta)
+
+
+def change_counters(source, instances, delta):
+    """Меняет счетчики для пакета объектов-источников.
+
+    Объекты группируются по приращению счетчика, и на каждое различное
+    приращение выполняется один UPDATE (для пакета одного пользователя —
+    обычно один на счетчик).
+    """
+    for model, field, relation in COUNTERS[source]:
+        pks_by_change = defaultdict(list)
+        for pk, count in Counter(
+                getattr(instance, f'{relation}_id')
+                for instance in instances).items():
+            pks_by_change[count * delta].append(pk)
+
+        for change, pks in pks_by_change.items():
+            queryset = model.objects.filter(pk__in=pks)
+
+            if change < 0:
+                queryset = queryset.filter(**{f'{field}__gte': -change})
+
+            queryset.update(**{field: F(field) + change})
+
+
+def get_actual_count(source, relation):
+    """Выражение с фактическим значением счетчика для queryset модели."""
+    return Coalesce(Subquery(
+        source.objects.filter(**{relation: OuterRef('pk')}).order_by()
+        .values(relation).annotate(total=Count('pk')).values('total')), 0)
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F
+
+from recipes.models import Recipe, Subscription, TimelineEntry
+
+User = get_user_model()
+
+
+def _fan_out(where, params):
+    """Записывает в ленты рецепты авторов из подписок, отобранных where.
+
+    Пользователи, подписанные на слишком многих авторов, пропускаются:
+    их лента собирается при чтении (см. get_feed_queryset). Уже
+    существующие записи не дублируются.
+    """
+    ops = connection.ops
+    table = ops.quote_name(TimelineEntry._meta.db_table)
+    subscriptions = ops.quote_name(Subscription._meta.db_table)
+    users = ops.quote_name(User._meta.db_table)
+    recipes = ops.quote_name(Recipe._meta.db_table)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} {table} '
+            f'(user_id, recipe_id, author_id, created) '
+            f'SELECT s.user_id, r.id, r.author_id, r.created '
+            f'FROM {subscriptions} s '
+            f'JOIN {users} u ON u.id = s.user_id '
+            f'JOIN {recipes} r ON r.author_id = s.author_id '
+            f'WHERE u.following_count <= %s {where} '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [settings.FEED_TIMELINE_MAX_FOLLOWING, *params])
+
+
+def add_recipe_to_timelines(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора."""
+    _fan_out('AND r.id = %s', (recipe.pk,))
+
+
+def add_author_to_timeline(user_id, author_id):
+    """Добавляет в ленту рецепты автора, на которого подписался user."""
+    _fan_out('AND s.user_id = %s AND s.author_id = %s', (user_id, author_id))
+
+
+def remove_author_from_timeline(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def drop_timeline_over_limit(user_id):
+    """Очищает ленту, если число подписок user превысило лимит."""
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        user__following_count__gt=settings.FEED_TIMELINE_MAX_FOLLOWING,
+    ).delete()
+
+
+def restore_timeline_at_limit(user_id):
+    """Заполняет ленту, если число подписок user опустилось до лимита.
+
+    Пока подписок было больше лимита, лента не хранилась, поэтому после
+    отписки она строится заново по всем подпискам.
+    """
+    _fan_out(
+        'AND s.user_id = %s AND u.following_count = %s',
+        (user_id, settings.FEED_TIMELINE_MAX_FOLLOWING))
+
+
+def rebuild_timelines():
+    """Перестраивает ленты всех пользователей."""
+    TimelineEntry.objects.all().delete()
+    _fan_out('', ())
+
+
+def get_feed_queryset(queryset, user):
+    """Рецепты авторов, на которых подписан user, для ленты.
+
+    Ленту пользователя с подписками в пределах лимита страница читает
+    одним проходом по индексу (user, -created, -recipe) таблицы лент.
+    Для остальных лента собирается слиянием рецептов авторов по индексу
+    (author, -created, -id). Порядок задают аннотации feed_created и
+    feed_id.
+    """
+    if user.following_count <= settings.FEED_TIMELINE_MAX_FOLLOWING:
+        return queryset.filter(timeline_entries__user=user).annotate(
+            feed_created=F('timeline_entries__created'),
+            feed_id=F('timeline_entries__recipe_id'),
+        ).order_by('-feed_created', '-feed_id')
+
+    return queryset.filter(author__subscripters__user=user).annotate(
+        feed_created=F('created'), feed_id=F('id'),
+    ).order_by('-feed_created', '-feed_id')
@@ -0,0 +1,124 @@
+import re
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import F, Q
+
+from core.fulltext import SearchRank
+from recipes.models import (
+    Ingredient,
+    IngredientRecipeRelation,
+    Recipe,
+    RecipeSearch,
+)
+
+SEARCH_TABLE = RecipeSearch._meta.db_table
+CHUNK_SIZE = 500
+WORD = re.compile(r'\w+')
+
+
+def _get_index_sql(db, where):
+    """SQL и параметры для записи в индекс рецептов, отобранных where."""
+    ops = db.ops
+    table = ops.quote_name(SEARCH_TABLE)
+    recipes = ops.quote_name(Recipe._meta.db_table)
+    relations = ops.quote_name(IngredientRecipeRelation._meta.db_table)
+    ingredients = ops.quote_name(Ingredient._meta.db_table)
+    aggregate = 'string_agg' if db.vendor == 'postgresql' else 'group_concat'
+    ingredient_names = (
+        f"COALESCE((SELECT {aggregate}(i.name, ' ') FROM {relations} ri "
+        f'JOIN {ingredients} i ON i.id = ri.ingredient_id '
+        f"WHERE ri.recipe_id = r.id), '')")
+
+    if db.vendor == 'postgresql':
+        return (
+            f'INSERT INTO {table} (recipe_id, document) '
+            f'SELECT r.id, '
+            f"setweight(to_tsvector(%s::regconfig, r.name), 'A') || "
+            f"setweight(to_tsvector(%s::regconfig, r.text), 'B') || "
+            f"setweight(to_tsvector(%s::regconfig, {ingredient_names}), 'C') "
+            f'FROM {recipes} r {where} '
+            f'ON CONFLICT (recipe_id) '
+            f'DO UPDATE SET document = EXCLUDED.document',
+            [settings.RECIPE_SEARCH_CONFIG] * 3)
+
+    return (
+        f'INSERT INTO {table} (rowid, recipe_id, name, text, ingredients) '
+        f'SELECT r.id, r.id, r.name, r.text, {ingredient_names} '
+        f'FROM {recipes} r {where}', [])
+
+
+def update_search_index(recipe_ids=None):
+    """Переиндексирует рецепты с указанными id или все рецепты."""
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return
+
+    if recipe_ids is None:
+        delete_from_search_index(None)
+        sql, params = _get_index_sql(connection, '')
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+        return
+
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), CHUNK_SIZE):
+        chunk = recipe_ids[start:start + CHUNK_SIZE]
+        placeholders = ', '.join(['%s'] * len(chunk))
+
+        if connection.vendor == 'sqlite':
+            delete_from_search_index(chunk)
+
+        sql, params = _get_index_sql(
+            connection, f'WHERE r.id IN ({placeholders})')
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + chunk)
+
+
+def delete_from_search_index(recipe_ids):
+    """Удаляет рецепты из индекса; None — очистить индекс целиком."""
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return
+
+    table = connection.ops.quote_name(SEARCH_TABLE)
+    column = 'recipe_id' if connection.vendor == 'postgresql' else 'rowid'
+
+    with connection.cursor() as cursor:
+        if recipe_ids is None:
+            cursor.execute(f'DELETE FROM {table}')
+            return
+
+        recipe_ids = list(recipe_ids)
+        for start in range(0, len(recipe_ids), CHUNK_SIZE):
+            chunk = recipe_ids[start:start + CHUNK_SIZE]
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {column} IN ({{}})'.format(
+                    ', '.join(['%s'] * len(chunk))), chunk)
+
+
+def search_recipes(queryset, query):
+    """Оставляет рецепты, подходящие под запрос, по убыванию релевантности.
+
+    Релевантность попадает в аннотацию search_rank. На СУБД без
+    полнотекстового индекса поиск сводится к icontains по названию и
+    описанию.
+    """
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'sqlite':
+        words = WORD.findall(query)
+        if not words:
+            return queryset.none()
+
+        # В FTS5 нет русского стемминга, поэтому каждое слово ищется как
+        # префикс; кавычки не дают словам запроса стать операторами FTS5.
+        query = ' '.join(f'"{word}"*' for word in words)
+    elif vendor != 'postgresql':
+        return queryset.filter(
+            Q(name__icontains=query) | Q(text__icontains=query))
+
+    # Индекс присоединяется к рецептам одним JOIN: совпадения отбираются по
+    # индексу (в PostgreSQL — по GIN-индексу), и ранг считается за тот же
+    # проход.
+    return queryset.filter(search_document__document__match=query).annotate(
+        search_rank=SearchRank(F('search_document__document'), query),
+    ).order_by('-search_rank', *Recipe._meta.ordering)
@@ -1,11 +1,48 @@
 import csv
+import io
 import json
 import mimetypes
 import os
+import re
+import time
+from itertools import islice
 
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 
-from recipes.models import Ingredient
+from recipes.catalog import INGREDIENTS, bump_catalog_version
+from recipes.models import Ingredient, IngredientRecipeRelation
+
+FIELDS = ('name', 'measurement_unit')
+SEPARATOR = re.compile(r'\s*,?\s*')
+
+
+def iter_json_array(fp, chunk_size=64 * 1024):
+    """Разбирает JSON-массив объектов по частям, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = fp.read(chunk_size).lstrip()
+
+    if not buffer.startswith('['):
+        raise ValueError('Ожидался JSON-массив')
+    position = 1
+
+    while True:
+        position = SEPARATOR.match(buffer, position).end()
+
+        if buffer.startswith(']', position):
+            return
+
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        yield item
 
 
 class Command(BaseCommand):
@@ -18,26 +55,115 @@ class Command(BaseCommand):
             'filename', type=str, help='Путь к файлу .json/.csv с данными')
         parser.add_argument(
             '--keep-existing-data', action='store_true',
-            help='Предварительная очистка данных модели Ingredients')
+            help='Не удалять ингредиенты, не используемые в рецептах, '
+                 'перед импортом')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество строк, записываемых за один запрос')
 
     def __load_data_from_file(self, filename, mimetype):
-        with open(filename, newline='') as fp:
+        with open(filename, newline='', encoding='utf-8') as fp:
             try:
                 if mimetype == 'text/csv':
-                    data = csv.DictReader(
-                        fp, fieldnames=('name', 'measurement_unit'))
+                    data = csv.reader(fp)
                 else:
-                    data = json.load(fp)
-            except (json.decoder.JSONDecodeError, TypeError):
+                    data = (
+                        (item['name'], item['measurement_unit'])
+                        for item in iter_json_array(fp))
+
+                yield from data
+            except (ValueError, KeyError, TypeError, csv.Error):
                 self.stderr.write(f'Файл {filename} содержит ошибки')
                 raise SystemExit
 
-            for item in data:
-                yield item
+    def __clean_rows(self, rows):
+        max_lengths = [
+            Ingredient._meta.get_field(field).max_length for field in FIELDS]
+
+        for row in rows:
+            row = tuple(str(value).strip() for value in row)
+
+            if len(row) != len(FIELDS) or not all(row) or any(
+                    len(value) > max_length
+                    for value, max_length in zip(row, max_lengths)):
+                self.skipped += 1
+                continue
+
+            yield row
+
+    @staticmethod
+    def __delete_unused():
+        """Удаляет ингредиенты, на которые не ссылаются рецепты."""
+        ingredients = connection.ops.quote_name(Ingredient._meta.db_table)
+        relations = connection.ops.quote_name(
+            IngredientRecipeRelation._meta.db_table)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {ingredients} WHERE NOT EXISTS ('
+                f'SELECT 1 FROM {relations} '
+                f'WHERE {relations}.ingredient_id = {ingredients}.id)')
+            return cursor.rowcount
+
+    @staticmethod
+    def __insert_batch(cursor, batch):
+        """INSERT, пропускающий уже существующие ингредиенты.
+
+        Запрос собирается из синтаксиса текущей СУБД так же, как это делает
+        bulk_create(ignore_conflicts=True), но без создания объектов модели.
+        """
+        ops = connection.ops
+        cursor.executemany(
+            '{} {} (name, measurement_unit) VALUES (%s, %s) {}'.format(
+                ops.insert_statement(ignore_conflicts=True),
+                ops.quote_name(Ingredient._meta.db_table),
+                ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)),
+            batch)
+
+    @staticmethod
+    def __copy_batch(cursor, batch):
+        """Быстрый путь для PostgreSQL: COPY во временную таблицу."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+
+        cursor.copy_expert(
+            'COPY ingredient_import (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)', buffer)
+        cursor.execute(
+            'INSERT INTO {} (name, measurement_unit) '
+            'SELECT DISTINCT name, measurement_unit FROM ingredient_import '
+            'ON CONFLICT (name, measurement_unit) DO NOTHING'.format(
+                connection.ops.quote_name(Ingredient._meta.db_table)))
+        cursor.execute('TRUNCATE ingredient_import')
+
+    def __import(self, rows, batch_size):
+        use_copy = connection.vendor == 'postgresql'
+        processed = 0
+
+        with connection.cursor() as cursor:
+            if use_copy:
+                cursor.execute(
+                    'CREATE TEMP TABLE ingredient_import '
+                    '(name varchar(200), measurement_unit varchar(32)) '
+                    'ON COMMIT DROP')
+
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    return processed
+
+                if use_copy:
+                    self.__copy_batch(cursor, batch)
+                else:
+                    self.__insert_batch(cursor, batch)
+
+                processed += len(batch)
+                self.stdout.write(f'Обработано строк: {processed}')
 
     def handle(self, *args, **options):
         filename = options.get('filename')
-        wipe_data = not options.get('keep-exisiting-data')
+        wipe_data = not options.get('keep_existing_data')
 
         if not os.path.isfile(filename):
             self.stderr.write(f'Файл {filename} не найден')
@@ -49,9 +175,24 @@ class Command(BaseCommand):
             self.stderr.write(f'Файл {filename} имеет запрещенный формат')
             raise SystemExit
 
-        if wipe_data:
-            Ingredient.objects.all().delete()
+        started = time.perf_counter()
+        self.skipped = 0
+        before = Ingredient.objects.count()
+
+        with transaction.atomic():
+            deleted = self.__delete_unused() if wipe_data else 0
+            processed = self.__import(
+                self.__clean_rows(
+                    self.__load_data_from_file(filename, mimetype)),
+                options['batch_size'])
+
+        # bulk_create и COPY не отправляют сигналы, поэтому версия
+        # справочника обновляется явно.
+        bump_catalog_version(INGREDIENTS)
 
-        for item in self.__load_data_from_file(filename, mimetype):
-            obj = Ingredient(**item)
-            obj.save()
+        created = Ingredient.objects.count() - before + deleted
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с: '
+            f'обработано {processed}, добавлено {created}, '
+            f'удалено неиспользуемых {deleted}, '
+            f'пропущено некорректных {self.skipped}'))
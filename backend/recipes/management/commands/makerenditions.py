@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+
+from core.images import make_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает недостающие уменьшенные копии изображений рецептов (для '
+        'рецептов, сохраненных до их появления или в обход моделей)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--overwrite', action='store_true',
+            help='Пересоздать и существующие копии')
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field('image')
+        names = Recipe.objects.exclude(image='').order_by().values_list(
+            'image', flat=True).distinct()
+        created = 0
+        failed = 0
+
+        for name in names.iterator():
+            image = field.attr_class(None, field, name)
+            try:
+                created += make_renditions(image, options['overwrite'])
+            except (OSError, UnidentifiedImageError) as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано копий: {created}, изображений с ошибками: {failed}'))
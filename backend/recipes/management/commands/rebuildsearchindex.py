@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.fulltext import update_search_index
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает полнотекстовый индекс рецептов (после загрузки '
+        'данных в обход моделей)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            update_search_index()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {Recipe.objects.count()}'))
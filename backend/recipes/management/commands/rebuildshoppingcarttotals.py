@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.cart_totals import rebuild_totals
+from recipes.models import ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает итоги списков покупок по рецептам в списках (после '
+        'изменения данных в обход API)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_totals()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк в итогах списков покупок: '
+            f'{ShoppingCartTotal.objects.count()}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import rebuild_timelines
+from recipes.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает ленты подписок (после загрузки рецептов или подписок '
+        'в обход моделей и пересчета счетчиков)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_timelines()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'))
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import COUNTERS, get_actual_count
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики избранного, списков покупок, рецептов, '
+        'подписчиков и подписок и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Количество строк, обрабатываемых за одну транзакцию')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, не исправляя их')
+
+    @staticmethod
+    def get_counters():
+        """Группирует счетчики по моделям, в которых они хранятся."""
+        counters = {}
+
+        for source, source_counters in COUNTERS.items():
+            for model, field, relation in source_counters:
+                counters.setdefault(model, []).append(
+                    (field, source, relation))
+
+        return counters
+
+    def repair(self, model, fields, chunk_size, dry_run):
+        annotations = {
+            f'actual_{field}': get_actual_count(source, relation)
+            for field, source, relation in fields}
+        queryset = model.objects.order_by('pk').annotate(**annotations)
+        last_pk = 0
+        repaired = 0
+
+        while True:
+            with transaction.atomic():
+                chunk = list(
+                    queryset.filter(pk__gt=last_pk)
+                    .select_for_update()[:chunk_size])
+                if not chunk:
+                    return repaired
+
+                changed = []
+                for obj in chunk:
+                    drifted = False
+                    for field, _, _ in fields:
+                        actual = getattr(obj, f'actual_{field}')
+                        if getattr(obj, field) != actual:
+                            setattr(obj, field, actual)
+                            drifted = True
+                    if drifted:
+                        changed.append(obj)
+
+                if changed and not dry_run:
+                    model.objects.bulk_update(
+                        changed, [field for field, _, _ in fields])
+
+            repaired += len(changed)
+            last_pk = chunk[-1].pk
+
+    def handle(self, *args, **options):
+        for model, fields in self.get_counters().items():
+            repaired = self.repair(
+                model, fields, options['chunk_size'], options['dry_run'])
+            self.stdout.write('{}: расхождений {}{}'.format(
+                model._meta.verbose_name_plural, repaired,
+                ' (не исправлены)' if options['dry_run'] else ''))
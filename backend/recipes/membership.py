@@ -0,0 +1,96 @@
+import time
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import Favorite, ShoppingCart, Subscription
+
+MEMBERSHIP_KEY = 'membership:{}:{}:{}'
+MEMBERSHIP_VERSION_KEY = 'membership_version:{}:{}'
+MEMBERSHIP_ATTR = '_membership_cache'
+
+# Модель -> поле с id объекта, входящего в набор пользователя.
+MEMBERSHIPS = {
+    Favorite: 'recipe_id',
+    ShoppingCart: 'recipe_id',
+    Subscription: 'author_id',
+}
+
+
+def get_membership_version(model, user_id):
+    """Текущая версия набора пользователя (время его изменения в нс)."""
+    key = MEMBERSHIP_VERSION_KEY.format(model._meta.model_name, user_id)
+    version = cache.get(key)
+
+    if version is not None:
+        return version
+
+    cache.add(key, time.time_ns(), settings.MEMBERSHIP_CACHE_TTL)
+    return cache.get(key)
+
+
+def get_membership_key(model, user_id, version):
+    return MEMBERSHIP_KEY.format(model._meta.model_name, user_id, version)
+
+
+def load_ids(data):
+    ids = array('q')
+    ids.frombytes(data)
+    return ids
+
+
+def get_membership(request, model):
+    """Возвращает множество id рецептов (авторов) из набора пользователя.
+
+    В кэше Django набор хранится как отсортированный массив int64 под
+    ключом с версией набора, в пределах запроса — как множество на объекте
+    запроса. Версия читается до запроса к БД: если набор изменится, пока
+    он загружается, загруженные данные сохранятся под старой версией и
+    читаться не будут.
+    """
+    memo = request.__dict__.setdefault(MEMBERSHIP_ATTR, {})
+
+    if model not in memo:
+        user_id = request.user.pk
+        key = get_membership_key(
+            model, user_id, get_membership_version(model, user_id))
+        data = cache.get(key)
+
+        if data is None:
+            field = MEMBERSHIPS[model]
+            # Набор читается с основной БД: отставшая реплика закэшировала
+            # бы устаревший набор на MEMBERSHIP_CACHE_TTL.
+            ids = array('q', sorted(model.objects.using('default').filter(
+                user_id=user_id).values_list(field, flat=True)))
+            cache.set(key, ids.tobytes(), settings.MEMBERSHIP_CACHE_TTL)
+        else:
+            ids = load_ids(data)
+
+        memo[model] = frozenset(ids)
+
+    return memo[model]
+
+
+def is_member(request, model, pk):
+    return (request.user.is_authenticated
+            and pk in get_membership(request, model))
+
+
+def invalidate_membership(model, user_id):
+    """Сбрасывает закэшированный набор пользователя после его изменения.
+
+    Набор не правится на месте: одновременные изменения одного набора
+    теряли бы друг друга. Вместо этого меняется версия, и следующее чтение
+    загружает набор из БД.
+    """
+    invalidate_memberships(model, (user_id,))
+
+
+def invalidate_memberships(model, user_ids):
+    """Сбрасывает наборы нескольких пользователей одним обращением к кэшу."""
+    version = time.time_ns()
+    cache.set_many({
+        MEMBERSHIP_VERSION_KEY.format(model._meta.model_name, user_id):
+            version
+        for user_id in user_ids}, settings.MEMBERSHIP_CACHE_TTL)
@@ -0,0 +1,32 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favorite', 'recipe'),
+    ('recipes.Recipe', 'shopping_cart_count', 'recipes.ShoppingCart',
+     'recipe'),
+    ('users.CustomUser', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users.CustomUser', 'followers_count', 'recipes.Subscription', 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for model, field, source, relation in COUNTERS:
+        source = apps.get_model(source)
+        apps.get_model(model).objects.update(**{field: Coalesce(Subquery(
+            source.objects.filter(**{relation: OuterRef('pk')}).order_by()
+            .values(relation).annotate(total=Count('pk')).values('total')),
+            0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_auto_20261018_0524'),
+        ('users', '0006_auto_20261018_0524'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.db import migrations
+
+# Миграция не зависит от recipes.fulltext: таблица и начальное заполнение
+# индекса описаны здесь, чтобы последующие изменения кода и моделей не
+# меняли результат ее применения.
+SEARCH_TABLE = 'recipes_recipesearch'
+# Ранжирование FTS5 с весами названия, описания и ингредиентов — теми же,
+# что веса A, B и C в ts_rank по умолчанию.
+FTS5_RANK = 'bm25(1.0, 0.4, 0.2)'
+
+
+def create_search_index(apps, schema_editor):
+    db = schema_editor.connection
+    if db.vendor not in ('postgresql', 'sqlite'):
+        return
+
+    ops = db.ops
+    table = ops.quote_name(SEARCH_TABLE)
+    recipes = ops.quote_name(apps.get_model('recipes.Recipe')._meta.db_table)
+    relations = ops.quote_name(
+        apps.get_model('recipes.IngredientRecipeRelation')._meta.db_table)
+    ingredients = ops.quote_name(
+        apps.get_model('recipes.Ingredient')._meta.db_table)
+    aggregate = 'string_agg' if db.vendor == 'postgresql' else 'group_concat'
+    ingredient_names = (
+        f"COALESCE((SELECT {aggregate}(i.name, ' ') FROM {relations} ri "
+        f'JOIN {ingredients} i ON i.id = ri.ingredient_id '
+        f"WHERE ri.recipe_id = r.id), '')")
+
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE TABLE {table} ('
+                f'recipe_id integer PRIMARY KEY, document tsvector NOT NULL)')
+            cursor.execute(
+                f'CREATE INDEX recipes_recipesearch_document_idx '
+                f'ON {table} USING gin (document)')
+            cursor.execute(
+                f'INSERT INTO {table} (recipe_id, document) '
+                f'SELECT r.id, '
+                f"setweight(to_tsvector(%s::regconfig, r.name), 'A') || "
+                f"setweight(to_tsvector(%s::regconfig, r.text), 'B') || "
+                f"setweight(to_tsvector(%s::regconfig, {ingredient_names}), "
+                f"'C') FROM {recipes} r",
+                [settings.RECIPE_SEARCH_CONFIG] * 3)
+        else:
+            # recipe_id повторяет rowid: по нему модель RecipeSearch
+            # присоединяет индекс к рецептам.
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE {table} USING fts5('
+                f'name, text, ingredients, recipe_id UNINDEXED, '
+                f"tokenize='unicode61 remove_diacritics 2')")
+            # Функция ранжирования сохраняется в настройках таблицы, и
+            # скрытый столбец rank считается по ней.
+            cursor.execute(
+                f'INSERT INTO {table} ({table}, rank) VALUES (%s, %s)',
+                ('rank', FTS5_RANK))
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(rowid, recipe_id, name, text, ingredients) '
+                f'SELECT r.id, r.id, r.name, r.text, {ingredient_names} '
+                f'FROM {recipes} r')
+
+
+def drop_search_index(apps, schema_editor):
+    db = schema_editor.connection
+    if db.vendor in ('postgresql', 'sqlite'):
+        with db.cursor() as cursor:
+            cursor.execute(
+                f'DROP TABLE IF EXISTS {db.ops.quote_name(SEARCH_TABLE)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_fill_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_timelines(apps, schema_editor):
+    Subscription = apps.get_model('recipes.Subscription')
+    User = apps.get_model('users.CustomUser')
+    User.objects.update(
+        following_count=Coalesce(Subquery(
+            Subscription.objects.filter(user=OuterRef('pk')).order_by()
+            .values('user').annotate(total=Count('pk')).values('total')), 0))
+
+    # Ленты заполняются так же, как в recipes.feed, но своим SQL: миграция
+    # не должна зависеть от текущих моделей и кода.
+    db = schema_editor.connection
+    ops = db.ops
+    table = ops.quote_name(
+        apps.get_model('recipes.TimelineEntry')._meta.db_table)
+    subscriptions = ops.quote_name(Subscription._meta.db_table)
+    users = ops.quote_name(User._meta.db_table)
+    recipes = ops.quote_name(apps.get_model('recipes.Recipe')._meta.db_table)
+
+    with db.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (user_id, recipe_id, author_id, created) '
+            f'SELECT s.user_id, r.id, r.author_id, r.created '
+            f'FROM {subscriptions} s '
+            f'JOIN {users} u ON u.id = s.user_id '
+            f'JOIN {recipes} r ON r.author_id = s.author_id '
+            f'WHERE u.following_count <= %s',
+            [settings.FEED_TIMELINE_MAX_FOLLOWING])
+
+
+def clear_timelines(apps, schema_editor):
+    apps.get_model('recipes.TimelineEntry').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_auto_20261018_0551'),
+        ('users', '0007_customuser_following_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_timelines, clear_timelines),
+    ]
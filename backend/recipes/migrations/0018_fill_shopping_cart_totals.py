@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def fill_shopping_cart_totals(apps, schema_editor):
+    # Итоги считаются так же, как в recipes.cart_totals.rebuild_totals, но
+    # своим SQL: миграция не должна зависеть от текущих моделей и кода.
+    db = schema_editor.connection
+    quote_name = db.ops.quote_name
+    table = quote_name(
+        apps.get_model('recipes.ShoppingCartTotal')._meta.db_table)
+    relations = quote_name(
+        apps.get_model('recipes.IngredientRecipeRelation')._meta.db_table)
+    cart = quote_name(apps.get_model('recipes.ShoppingCart')._meta.db_table)
+
+    with db.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} '
+            f'(user_id, ingredient_id, amount, recipes_count) '
+            f'SELECT c.user_id, ri.ingredient_id, SUM(ri.amount), COUNT(*) '
+            f'FROM {cart} c JOIN {relations} ri ON ri.recipe_id = c.recipe_id '
+            f'GROUP BY c.user_id, ri.ingredient_id')
+
+
+def clear_shopping_cart_totals(apps, schema_editor):
+    apps.get_model('recipes.ShoppingCartTotal').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_auto_20261018_0554'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            fill_shopping_cart_totals, clear_shopping_cart_totals),
+    ]
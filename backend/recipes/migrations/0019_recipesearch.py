@@ -0,0 +1,28 @@
+# Generated by Django 2.2.27 on 2026-10-18 03:28
+
+import core.fulltext
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_fill_shopping_cart_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearch',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='recipes.Recipe', verbose_name='Рецепт')),
+                ('document', core.fulltext.SearchDocumentField(config='russian', verbose_name='Документ')),
+            ],
+            options={
+                'verbose_name': 'документ поиска',
+                'verbose_name_plural': 'документы поиска',
+                'db_table': 'recipes_recipesearch',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 from sorl.thumbnail import ImageField
 
+from core.fulltext import SearchDocumentField
 from core.images import upload_to
 
 User = get_user_model()
@@ -75,16 +77,46 @@ class Recipe(BaseModel):
     ingredients = models.ManyToManyField(
         Ingredient, verbose_name='Ингридиенты', related_name='recipes',
         through='IngredientRecipeRelation')
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False)
+    shopping_cart_count = models.PositiveIntegerField(
+        'В списке покупок', default=0, editable=False)
 
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'рецепты'
-        ordering = ('-created',)
+        ordering = ('-created', '-id')
+        indexes = [
+            models.Index(
+                fields=('-created', '-id'), name='recipe_created_id_idx'),
+            models.Index(
+                fields=('author', '-created', '-id'),
+                name='recipe_author_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeSearch(models.Model):
+    """Строка полнотекстового индекса рецептов (см. recipes.fulltext).
+
+    Таблицу создает и заполняет миграция 0014, модель нужна только для
+    JOIN индекса с рецептами в запросах поиска.
+    """
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.DO_NOTHING, primary_key=True,
+        related_name='search_document', verbose_name='Рецепт')
+    document = SearchDocumentField(
+        'Документ', config=settings.RECIPE_SEARCH_CONFIG)
+
+    class Meta:
+        managed = False
+        db_table = 'recipes_recipesearch'
+        verbose_name = 'документ поиска'
+        verbose_name_plural = 'документы поиска'
+
+
 class IngredientRecipeRelation(models.Model):
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE, verbose_name='Рецепт')
@@ -146,6 +178,12 @@ class ShoppingCart(BaseModel):
             models.UniqueConstraint(
                 fields=('recipe', 'user'), name='Unique cart')
         ]
+        indexes = [
+            models.Index(
+                fields=('user', 'recipe'), name='cart_user_recipe_idx'),
+            models.Index(
+                fields=('user', '-created'), name='cart_user_created_idx'),
+        ]
 
     def __str__(self):
         return 'Рецепт \'{}\' в списке покупок \'{} {}\''.format(
@@ -169,8 +207,79 @@ class Favorite(BaseModel):
             models.UniqueConstraint(
                 fields=('recipe', 'user'), name='Unique favorite')
         ]
+        indexes = [
+            models.Index(
+                fields=('user', 'recipe'), name='favorite_user_recipe_idx'),
+            models.Index(
+                fields=('user', '-created'), name='favorite_user_created_idx'),
+        ]
 
     def __str__(self):
         return 'Рецепт \'{}\' в избранном \'{} {}\''.format(
             self.recipe.name, self.user.first_name, self.user.last_name
         )
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписчика его автора (fan-out on write).
+
+    created и author повторяют поля рецепта: страница ленты читается
+    одним проходом по индексу (user, -created, -recipe).
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline',
+        verbose_name='Пользователь')
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='timeline_entries',
+        verbose_name='Рецепт')
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+',
+        verbose_name='Автор')
+    created = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'), name='Unique timeline entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-created', '-recipe'),
+                name='timeline_user_created_idx'),
+            models.Index(
+                fields=('user', 'author'), name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'Рецепт {self.recipe_id} в ленте {self.user_id}'
+
+
+class ShoppingCartTotal(models.Model):
+    """Сумма ингредиента по всем рецептам списка покупок пользователя.
+
+    Обновляется при добавлении и удалении рецептов из списка и при
+    изменении их ингредиентов; recipes_count — число рецептов списка с
+    этим ингредиентом, строка удаляется, когда оно становится нулевым.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shopping_cart_totals',
+        verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, related_name='+',
+        verbose_name='Ингредиент')
+    amount = models.IntegerField('Количество')
+    recipes_count = models.IntegerField('Рецептов')
+
+    class Meta:
+        verbose_name = 'итог списка покупок'
+        verbose_name_plural = 'итоги списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='Unique shopping cart total')
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient_id}: {self.amount} в списке {self.user_id}'
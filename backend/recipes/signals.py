@@ -0,0 +1,197 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from core.images import delete_renditions, make_renditions
+from recipes.cart_totals import (
+    add_recipe_to_totals,
+    add_recipes_to_totals,
+    subtract_recipe_from_totals,
+    subtract_recipes_from_totals,
+)
+from recipes.catalog import INGREDIENTS, TAGS, bump_catalog_version
+from recipes.counters import change_counter, change_counters
+from recipes.feed import (
+    add_author_to_timeline,
+    add_recipe_to_timelines,
+    drop_timeline_over_limit,
+    remove_author_from_timeline,
+    restore_timeline_at_limit,
+)
+from recipes.fulltext import delete_from_search_index, update_search_index
+from recipes.membership import invalidate_membership
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientRecipeRelation,
+    Recipe,
+    ShoppingCart,
+    Subscription,
+    Tag,
+)
+from recipes.toggles import members_added, members_removed
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    bump_catalog_version(INGREDIENTS)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    bump_catalog_version(TAGS)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def counter_source_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def counter_source_deleted(sender, instance, **kwargs):
+    change_counter(sender, instance, -1)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+def membership_saved(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(
+            invalidate_membership, sender, instance.user_id))
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def membership_deleted(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        invalidate_membership, sender, instance.user_id))
+
+
+# Пакеты записей из add_members и remove_members обрабатываются целиком:
+# счетчики и итоги меняются одним запросом на пакет.
+@receiver(members_added)
+def members_added_to_set(sender, user_id, instances, **kwargs):
+    change_counters(sender, instances, 1)
+    transaction.on_commit(partial(invalidate_membership, sender, user_id))
+
+    if sender is ShoppingCart:
+        add_recipes_to_totals(
+            (instance.recipe_id for instance in instances), user_id)
+    elif sender is Subscription:
+        for instance in instances:
+            add_author_to_timeline(user_id, instance.author_id)
+        drop_timeline_over_limit(user_id)
+
+
+@receiver(members_removed)
+def members_removed_from_set(sender, user_id, instances, **kwargs):
+    change_counters(sender, instances, -1)
+    transaction.on_commit(partial(invalidate_membership, sender, user_id))
+
+    if sender is ShoppingCart:
+        subtract_recipes_from_totals(
+            (instance.recipe_id for instance in instances), user_id)
+    elif sender is Subscription:
+        for instance in instances:
+            remove_author_from_timeline(user_id, instance.author_id)
+        restore_timeline_at_limit(user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, raw=False, **kwargs):
+    if instance.image and not raw:
+        transaction.on_commit(partial(make_renditions, instance.image))
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_image_replaced(sender, instance, raw=False, **kwargs):
+    # Новый файл сохраняется после сигнала, поэтому здесь в базе еще имя
+    # прежнего изображения.
+    if raw or instance.pk is None:
+        return
+    old_name = Recipe.objects.filter(pk=instance.pk).values_list(
+        'image', flat=True).first()
+    if old_name and old_name != instance.image.name:
+        transaction.on_commit(partial(
+            delete_renditions, instance.image.storage, old_name))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    if instance.image:
+        transaction.on_commit(partial(
+            delete_renditions, instance.image.storage, instance.image.name))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_search_saved(sender, instance, raw=False, **kwargs):
+    # Ингредиенты сохраняются после рецепта, поэтому индекс обновляется
+    # после фиксации транзакции.
+    if not raw:
+        transaction.on_commit(partial(update_search_index, (instance.pk,)))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_search_deleted(sender, instance, **kwargs):
+    delete_from_search_index((instance.pk,))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_search_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        transaction.on_commit(partial(
+            update_search_index,
+            IngredientRecipeRelation.objects.filter(
+                ingredient=instance).values_list('recipe_id', flat=True)))
+
+
+# Ленты обновляются после счетчиков: от числа подписок зависит, хранится
+# ли лента пользователя.
+@receiver(post_save, sender=Recipe)
+def recipe_timeline_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_recipe_to_timelines(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_timeline_saved(sender, instance, created, raw=False,
+                                **kwargs):
+    if created and not raw:
+        add_author_to_timeline(instance.user_id, instance.author_id)
+        drop_timeline_over_limit(instance.user_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_timeline_deleted(sender, instance, **kwargs):
+    remove_author_from_timeline(instance.user_id, instance.author_id)
+    restore_timeline_at_limit(instance.user_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_totals_saved(sender, instance, created, raw=False,
+                               **kwargs):
+    if created and not raw:
+        add_recipe_to_totals(instance.recipe_id, instance.user_id)
+
+
+# Итоги уменьшаются до удаления: при удалении рецепта его ингредиенты
+# удаляются вместе с записями списков покупок.
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_totals_deleted(sender, instance, **kwargs):
+    subtract_recipe_from_totals(instance.recipe_id, instance.user_id)
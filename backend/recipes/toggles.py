@@ -0,0 +1,169 @@
+from functools import partial
+
+from django.db import IntegrityError, connection, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from recipes.cart_totals import subtract_recipe_from_totals
+from recipes.membership import MEMBERSHIPS, invalidate_memberships
+from recipes.models import Favorite, ShoppingCart
+
+# Отправляются один раз на пакет записей, добавленных или удаленных одним
+# запросом, вместо post_save и post_delete для каждой записи: обработчики
+# (см. recipes.signals) меняют счетчики и итоги одним запросом на пакет.
+members_added = Signal(providing_args=('user_id', 'instances'))
+members_removed = Signal(providing_args=('user_id', 'instances'))
+
+
+def _can_return_rows():
+    """Поддерживает ли СУБД RETURNING в INSERT и DELETE."""
+    if connection.vendor == 'postgresql':
+        return True
+
+    return (connection.vendor == 'sqlite'
+            and connection.Database.sqlite_version_info >= (3, 35))
+
+
+def _get_target(model):
+    """Поле и модель объекта, входящего в набор пользователя."""
+    field = model._meta.get_field(MEMBERSHIPS[model])
+    return field, field.related_model
+
+
+def _make_instances(model, field, user_id, rows, **kwargs):
+    return [
+        model(pk=pk, user_id=user_id, **{field.attname: target_id}, **kwargs)
+        for pk, target_id in rows]
+
+
+def _insert_members(model, user_id, target_ids):
+    field, target_model = _get_target(model)
+    now = timezone.now()
+    ops = connection.ops
+    placeholders = ', '.join(['%s'] * len(target_ids))
+
+    with connection.cursor() as cursor:
+        # Цели выбираются из своей таблицы, поэтому несуществующие id
+        # пропускаются, а не нарушают внешний ключ.
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{ops.quote_name(model._meta.db_table)} '
+            f'(user_id, {field.column}, created) '
+            f'SELECT %s, t.id, %s '
+            f'FROM {ops.quote_name(target_model._meta.db_table)} t '
+            f'WHERE t.id IN ({placeholders}) '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)} '
+            f'RETURNING id, {field.column}',
+            [user_id, model._meta.get_field('created').get_db_prep_save(
+                now, connection), *target_ids])
+        rows = cursor.fetchall()
+
+    return _make_instances(model, field, user_id, rows, created=now)
+
+
+def _delete_members(model, user_id, target_ids):
+    field, _ = _get_target(model)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+            f'WHERE user_id = %s AND {field.column} IN ({placeholders}) '
+            f'RETURNING id, {field.column}',
+            [user_id, *target_ids])
+        rows = cursor.fetchall()
+
+    return _make_instances(model, field, user_id, rows)
+
+
+def add_members(model, user_id, target_ids):
+    """Добавляет рецепты (авторов) target_ids в набор пользователя.
+
+    Набор — избранное, список покупок или подписки. Запись делается одним
+    INSERT ... ON CONFLICT DO NOTHING: уже добавленные объекты и
+    несуществующие id пропускаются без ошибки, поэтому одновременные
+    повторные запросы не приводят к IntegrityError. Возвращает созданные
+    записи; о них отправляется один сигнал members_added. Без RETURNING
+    записи создаются по одной, с post_save для каждой.
+    """
+    target_ids = list(target_ids)
+    if not target_ids:
+        return []
+
+    with transaction.atomic():
+        if _can_return_rows():
+            created = _insert_members(model, user_id, target_ids)
+            if created:
+                members_added.send(
+                    sender=model, user_id=user_id, instances=created)
+            return created
+
+        field, target_model = _get_target(model)
+        created = []
+        for target_id in target_model.objects.filter(
+                pk__in=target_ids).values_list('pk', flat=True):
+            try:
+                with transaction.atomic():
+                    created.append(model.objects.create(
+                        user_id=user_id, **{field.attname: target_id}))
+            except IntegrityError:
+                pass
+
+        return created
+
+
+def remove_members(model, user_id, target_ids):
+    """Удаляет рецепты (авторов) target_ids из набора пользователя.
+
+    Записи удаляются одним DELETE ... RETURNING и возвращаются; о них
+    отправляется один сигнал members_removed. Без RETURNING записи
+    удаляются по одной, с post_delete для каждой.
+    """
+    target_ids = list(target_ids)
+    if not target_ids:
+        return []
+
+    with transaction.atomic():
+        if _can_return_rows():
+            deleted = _delete_members(model, user_id, target_ids)
+            if deleted:
+                members_removed.send(
+                    sender=model, user_id=user_id, instances=deleted)
+            return deleted
+
+        field, _ = _get_target(model)
+        deleted = list(model.objects.filter(
+            user_id=user_id, **{f'{field.attname}__in': target_ids}))
+        for instance in deleted:
+            instance.delete()
+
+        return deleted
+
+
+def delete_recipe(recipe):
+    """Удаляет рецепт, предварительно убрав его из наборов пользователей.
+
+    Каскад удалял бы записи избранного и списков покупок по одной, с
+    сигналами для каждой. Здесь итоги списков покупок уменьшаются одним
+    запросом, записи каждого набора удаляются одним DELETE, и число
+    запросов не зависит от числа пользователей с рецептом. Счетчики
+    удаляемого рецепта не меняются.
+    """
+    with transaction.atomic():
+        subtract_recipe_from_totals(recipe.pk)
+
+        for model in (Favorite, ShoppingCart):
+            user_ids = list(model.objects.filter(
+                recipe_id=recipe.pk).values_list('user_id', flat=True))
+            if not user_ids:
+                continue
+
+            table = connection.ops.quote_name(model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE recipe_id = %s', [recipe.pk])
+
+            transaction.on_commit(partial(
+                invalidate_memberships, model, user_ids))
+
+        recipe.delete()
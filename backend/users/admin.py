@@ -11,6 +11,7 @@ class CustomUserAdmin(UserAdmin):
     model = CustomUser
     list_display = ('first_name',
                     'email', 'is_staff', 'is_active',
+                    'recipes_count', 'followers_count', 'following_count',
                     )
     list_filter = (
         'first_name', 'email', 'is_staff', 'is_active',
@@ -26,7 +27,13 @@ class CustomUserAdmin(UserAdmin):
                 'is_staff', 'is_active',
             )
         }),
+        ('Информация', {
+            'fields': (
+                'recipes_count', 'followers_count', 'following_count',
+            )
+        }),
     )
+    readonly_fields = ('recipes_count', 'followers_count', 'following_count')
     add_fieldsets = (
         (None, {
             'classes': ('wide',),
@@ -13,6 +13,12 @@ class CustomUser(AbstractUser):
         'Имя', max_length=150)
     last_name = models.CharField(
         'Фамилия', max_length=150)
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False)
+    following_count = models.PositiveIntegerField(
+        'Подписок', default=0, editable=False)
 
     class Meta:
         ordering = ('id', )